@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Caches persistants (SQLite) pour Ultimate OCR & LLM Parser
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Dict, Any
+
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "ocr-llm"
+# Après un dépassement, l'éviction LRU ramène le cache à cette fraction de max_bytes
+EVICT_LOW_WATER = 0.9
+
+
+def file_sha256(path: Path, chunk_size: int = 1 << 20) -> str:
+    """Empreinte du contenu (lecture par blocs, sans charger le fichier entier)"""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class DiskCache:
+    """Cache clé -> texte sur disque, borné en taille avec éviction LRU (et TTL optionnel)"""
+
+    def __init__(self, db_path: Path, max_bytes: int = 512 * 1024 * 1024, ttl: Optional[float] = None):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = self.misses = self.evictions = 0
+        # Partagé entre les threads du mode lot
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON entries(last_access)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_created ON entries(created)")
+        # Taille totale tenue en mémoire : une seule somme à l'ouverture, puis mise à jour à chaque écriture
+        self._total = self._sum_size()
+
+    @staticmethod
+    def make_key(*parts: Any, **params: Any) -> str:
+        payload = json.dumps([parts, params], sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute("SELECT value, created, size FROM entries WHERE key=?", (key,)).fetchone()
+            now = time.time()
+            if row is not None and self.ttl is not None and now - row[1] > self.ttl:
+                self._db.execute("DELETE FROM entries WHERE key=?", (key,))
+                self._total -= row[2]
+                self.evictions += 1
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE entries SET last_access=? WHERE key=?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, value: str):
+        now = time.time()
+        size = len(value.encode('utf-8'))
+        with self._lock:
+            old = self._db.execute("SELECT size FROM entries WHERE key=?", (key,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries(key, value, size, created, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now)
+            )
+            self._total += size - (old[0] if old else 0)
+            self._evict()
+
+    def _sum_size(self) -> int:
+        return self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def _evict(self):
+        if self.ttl is not None:
+            # Parcours de l'index sur created : seules les entrées expirées sont lues
+            cutoff = time.time() - self.ttl
+            count, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries WHERE created < ?",
+                                           (cutoff,)).fetchone()
+            if count:
+                self._db.execute("DELETE FROM entries WHERE created < ?", (cutoff,))
+                self.evictions += count
+                self._total -= size
+        if self._total <= self.max_bytes: return
+        # Dépassement : on recale le total (un autre processus peut partager la base) avant d'évincer
+        self._total = self._sum_size()
+        if self._total <= self.max_bytes: return
+        # On descend sous un seuil bas : les écritures suivantes ne redéclenchent pas d'éviction tout de suite
+        target = int(self.max_bytes * EVICT_LOW_WATER)
+        while self._total > target:
+            rows = self._db.execute("SELECT key, size FROM entries ORDER BY last_access LIMIT 64").fetchall()
+            if not rows: break
+            for key, size in rows:
+                if self._total <= target: break
+                self._db.execute("DELETE FROM entries WHERE key=?", (key,))
+                self._total -= size
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            count, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": count, "bytes": size
+        }
+
+    def close(self):
+        self._db.close()
+
+
+class ExtractionCache(DiskCache):
+    """Résultats de SmartExtractor.extract, indexés par contenu du fichier + paramètres OCR"""
+
+    def __init__(self, cache_dir: Path = DEFAULT_CACHE_DIR, max_bytes: int = 512 * 1024 * 1024):
+        super().__init__(Path(cache_dir) / "extract.sqlite", max_bytes)
+
+    def key_for(self, file_path: Path, **params: Any) -> str:
+        return self.make_key(file_sha256(file_path), file_path.suffix.lower(), **params)
+
+
+class LLMCache(DiskCache):
+    """Réponses du LLM (temperature 0 => déterministes), indexées par modèle + prompt + options"""
+
+    def __init__(self, cache_dir: Path = DEFAULT_CACHE_DIR, max_bytes: int = 128 * 1024 * 1024,
+                 ttl: Optional[float] = 7 * 24 * 3600):
+        super().__init__(Path(cache_dir) / "llm.sqlite", max_bytes, ttl)
+
+    def key_for(self, model: str, prompt: str, **options: Any) -> str:
+        return self.make_key(model, prompt, **options)
@@ -4,6 +4,8 @@
 Ultimate OCR & LLM Parser (v3.3 - Auto-Detection Enabled)
 """
 
+from __future__ import annotations
+
 import os
 import sys
 import re
@@ -11,27 +13,59 @@ import json
 import argparse
 import logging
 import time
+import glob
+import hashlib
+import importlib
+import itertools
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Optional, Dict, List, Any
+from typing import Optional, Dict, List, Any, Tuple, Iterator, AsyncIterator, Callable, NamedTuple, Union
 from collections import Counter
+from contextlib import closing, nullcontext
+from functools import lru_cache
 
 # --- DEPENDANCES ---
 try:
-    import pymupdf4llm
-    import fitz  # PyMuPDF
-    from PIL import Image, ImageEnhance
-    import pytesseract
-    from pdf2image import convert_from_path
-    import cv2
-    import numpy as np
-    import ollama
     from rich.console import Console
     from rich.logging import RichHandler
-    from rich.json import JSON
-    from rich.panel import Panel
-    from rich.progress import track
 except ImportError as e:
-    sys.exit(f"❌ Dépendances manquantes : pip install pymupdf4llm pymupdf pytesseract pdf2image pillow ollama opencv-python-headless numpy rich")
+    sys.exit(f"❌ Dépendances manquantes : pip install rich")
+
+
+class _LazyModule:
+    """Module importé au premier accès à un attribut : `--help`, un PDF natif ou un résultat
+    en cache ne paient pas cv2/Tesseract/Ollama, et un backend absent ne casse que son étape."""
+
+    def __init__(self, alias: str, name: str, package: str):
+        self._alias, self._name, self._package = alias, name, package
+
+    def __getattr__(self, attr: str):
+        try:
+            module = importlib.import_module(self._name)
+        except ImportError as e:
+            raise ImportError(f"❌ Dépendance manquante : pip install {self._package}") from e
+        # Le nom global pointe ensuite directement sur le module : plus aucun surcoût
+        globals()[self._alias] = module
+        return getattr(module, attr)
+
+
+pymupdf4llm = _LazyModule("pymupdf4llm", "pymupdf4llm", "pymupdf4llm")
+fitz = _LazyModule("fitz", "fitz", "pymupdf")  # PyMuPDF
+Image = _LazyModule("Image", "PIL.Image", "pillow")
+pytesseract = _LazyModule("pytesseract", "pytesseract", "pytesseract")
+cv2 = _LazyModule("cv2", "cv2", "opencv-python-headless")
+np = _LazyModule("np", "numpy", "numpy")
+ollama = _LazyModule("ollama", "ollama", "ollama")
+httpx = _LazyModule("httpx", "httpx", "httpx")
+# Bibliothèque standard, mais ~50 ms (ssl) : seuls le mode lot et le service en ont besoin
+asyncio = _LazyModule("asyncio", "asyncio", "asyncio")
+
+from ocr_cache import ExtractionCache, LLMCache, DEFAULT_CACHE_DIR
+from ocr_metrics import METRICS
+from ocr_manifest import BatchManifest, Plan, MANIFEST_NAME
+from ocr_pipeline import Stage, StageQueue, STOP
+from ocr_store import ResultStore, DEFAULT_STORE, norm_amount
 
 # --- CONFIG ---
 console = Console()
@@ -41,50 +75,181 @@ logging.basicConfig(
 )
 logger = logging.getLogger("ocr_v3_3")
 
+# Chemin de tesseract.exe sous Windows (appliqué à l'import de pytesseract, voir PytesseractEngine)
+TESSERACT_CMD = None
 if os.name == 'nt':
     possibles = [r"C:\Program Files\Tesseract-OCR\tesseract.exe", r"C:\Program Files (x86)\Tesseract-OCR\tesseract.exe"]
     for p in possibles:
-        if os.path.exists(p): pytesseract.pytesseract.tesseract_cmd = p; break
+        if os.path.exists(p): TESSERACT_CMD = p; break
+
+SUPPORTED_EXTS = ['.pdf', '.jpg', '.png', '.jpeg']
+OCR_DPI = 300
+OCR_LANG = 'fra+eng'
+OCR_PSM = 4
+# A incrémenter à chaque modification de ImageProcessor (invalide le cache d'extraction)
+PREPROCESS_VERSION = 3
+# Caractères non blancs à partir desquels on fait confiance au texte natif d'une page
+NATIVE_MIN_CHARS = 50
+# DPI adaptatif (--dpi auto) : une sonde basse résolution mesure la hauteur du texte,
+# chaque page est rendue au DPI qui l'amène à TARGET_TEXT_PX pixels
+ADAPTIVE_DPI = "auto"
+PROBE_DPI = 100
+TARGET_TEXT_PX = 24
+MIN_DPI, MAX_DPI = 150, 400
+# Confiance Tesseract moyenne (0-100) sous laquelle la page est re-rendue plus finement
+MIN_CONFIDENCE = 70
+
+LLM_OPTIONS = {"temperature": 0.0, "num_ctx": 8192}
+# Durée pendant laquelle Ollama garde le modèle chargé après la dernière requête (défaut serveur : 5m)
+DEFAULT_KEEP_ALIVE = "30m"
+MAX_DOC_CHARS = 25000
+CHARS_PER_TOKEN = 3.5  # estimation grossière pour du texte FR/EN
+# Budget par défaut du texte envoyé en un seul prompt (équivalent de l'ancienne troncature)
+PROMPT_BUDGET_TOKENS = int(MAX_DOC_CHARS / CHARS_PER_TOKEN)
+
+# Schémas JSON cibles par type de document (aussi utilisés pour réduire le texte envoyé au LLM)
+SCHEMAS = {
+    "cv": {
+        "candidat": {"nom": "A déduire", "email": "", "telephone": "", "liens": []},
+        "profil_synthese": "Copier le texte d'intro",
+        "competences": {"langages": [], "outils": [], "soft_skills": []},
+        "experience": [{"poste": "", "entreprise": "", "dates": "", "missions": []}],
+        "education": [{"diplome": "", "ecole": "", "annee": ""}]
+    },
+    "facture": {
+        "document": {"type": "Facture/Devis", "numero": "", "date_emission": ""},
+        "emetteur": {"nom": "", "adresse": "", "siret": "", "iban": ""},
+        "client": {"nom": "", "adresse": ""},
+        "articles": [{"description": "", "qte": 0, "prix_unitaire": 0, "total_ligne": 0}],
+        "totaux": {"total_ht": 0.0, "total_tva": 0.0, "total_ttc": 0.0, "devise": "EUR/USD/MAD"}
+    },
+    "formulaire": {
+        "titre_formulaire": "",
+        "champs_reemplis": [{"label": "Ex: Nom", "valeur": "Ex: Dupont"}],
+        "cases_cochees": ["Liste des labels des cases cochées (ex: 'Sexe M')"],
+        "blocs_texte_libre": [],
+        "statut_signature": "Signé / Non Signé"
+    },
+    "generique": {
+        "resume": "Résumé global",
+        "entites_cles": [],
+        "dates": []
+    }
+}
+# Consignes propres à chaque type, placées dans le préfixe statique du prompt
+TYPE_RULES = {
+    "cv": "- Cherche le profil complet, les compétences techniques précises et détaille les expériences.",
+    "facture": "- Cherche les montants HT/TTC, le numéro de facture et les lignes d'articles. Convertis les nombres (ex: 10,00 -> 10.00).",
+    "formulaire": "- Associe chaque question à sa réponse. Identifie les cases marquées par [x] ou X. Récupère le texte manuscrit.",
+}
+
+# --- BALAYAGE DU TEXTE (classification + entités) ---
+# Mots-clés pondérés
+DOC_KEYWORDS = {
+    "cv": [
+        "curriculum", "expérience", "experience", "formation", "éducation", 
+        "education", "compétences", "skills", "langues", "profil", "hobbies", 
+        "loisirs", "stage", "freelance", "bachelor", "master", "diplôme"
+    ],
+    "facture": [
+        "facture", "invoice", "devis", "tva", "ht", "ttc", "total", 
+        "siret", "siren", "iban", "bic", "paiement", "échéance", "montant", 
+        "prix unitaire", "qty", "quantité", "article"
+    ],
+    "formulaire": [
+        "formulaire", "cerfa", "demande de", "je soussigné", "signature", 
+        "fait à", "le :", "cocher la case", "réservé à l'administration", 
+        "numéro de dossier", "déclaration", "attestation", "nom :", "prénom :"
+    ]
+}
+CURRENCY_WORDS = ["dhs"]
+
+class TextScan(NamedTuple):
+    keywords: Counter          # mot-clé -> occurrences (sous-chaînes comme en v3.3, plafonnées à KEYWORD_CAP)
+    emails: List[str]          # premier email de chaque domaine, dans l'ordre du texte
+    phones: List[str]
+    linkedins: List[str]
+    ibans: List[str]
+    has_currency: bool
+    has_profile_site: bool     # linkedin.com / github.com
+
+# La classification plafonne chaque mot-clé à 5 occurrences : inutile de compter au-delà
+KEYWORD_CAP = 5
+
+def _count_capped(text: str, word: str, cap: int = KEYWORD_CAP) -> int:
+    """text.count(word) arrêté à `cap` : un mot-clé fréquent ne fait pas parcourir tout le texte"""
+    n = pos = 0
+    while n < cap:
+        pos = text.find(word, pos)
+        if pos < 0: break
+        n, pos = n + 1, pos + len(word)
+    return n
+
+class TextScanner:
+    """Mots-clés de classification comptés comme en v3.3, en sous-chaînes ("expériences", "montants"
+    comptent pour leur mot-clé), mais arrêtés au plafond de la classification ; entités de contact / IBAN.
+    Résultat mémorisé par scan_text().
+    Les regex d'entités commencent par un littéral ou une classe de caractères, sans assertion :
+    le moteur re saute alors rapidement les positions qui ne peuvent pas correspondre."""
+
+    _EMAIL_DOMAIN = re.compile(r"@([a-zA-Z0-9.-]+\.[a-zA-Z]{2,})")
+    _EMAIL_LOCAL = re.compile(r"[a-zA-Z0-9._%+-]+$")
+    # (?!\d) : pas de faux numéro au milieu d'un IBAN
+    _PHONE = re.compile(r"(?:\+33|\+212|0)\s*[1-9](?:[\s.-]*\d{2}){4}(?!\d)")
+    _IBAN = re.compile(r"[A-Z][A-Z]\d\d(?: ?[A-Za-z0-9]{4}){2,7}(?: ?[A-Za-z0-9]{1,4})?(?!\w)")
+    _SITE = re.compile(r"linkedin\.com(?:/in/[a-z0-9_-]+)?|github\.com")
+
+    def __init__(self, keywords: Dict[str, List[str]] = DOC_KEYWORDS):
+        self.words = sorted({w for ws in keywords.values() for w in ws} | set(CURRENCY_WORDS))
+
+    def scan(self, text: str) -> TextScan:
+        low = text.lower()
+        keywords = Counter({w: n for w in self.words if (n := _count_capped(low, w))})
+        # Email cherché à partir de son "@" (rare), partie locale lue juste avant ; un par domaine
+        emails = {}
+        for m in self._EMAIL_DOMAIN.finditer(text):
+            local = self._EMAIL_LOCAL.search(text, max(0, m.start() - 64), m.start())
+            if local: emails.setdefault(m.group(1).lower(), local.group(0) + m.group(0))
+        ibans = (m.group(0).replace(" ", "") for m in self._IBAN.finditer(text) if not text[m.start() - 1:m.start()].isalnum())
+        sites = self._SITE.findall(low) if "linkedin.com" in low or "github.com" in low else []
+        return TextScan(
+            keywords=keywords, emails=list(emails.values()),
+            phones=list(dict.fromkeys(self._PHONE.findall(text))),
+            linkedins=list(dict.fromkeys(s for s in sites if s.startswith("linkedin.com/in/"))),
+            ibans=list(dict.fromkeys(ibans)),
+            has_currency="€" in text or "$" in text or keywords["dhs"] > 0,
+            has_profile_site=bool(sites)
+        )
+
+_SCANNER = TextScanner()
+
+@lru_cache(maxsize=8)
+def scan_text(text: str) -> TextScan:
+    """Résultat mémorisé : classification, booster et fusion partagent le même passage"""
+    return _SCANNER.scan(text)
 
 # --- NOUVELLE CLASSE DE DETECTION ---
 class DocumentClassifier:
     """Algorithme heuristique pour deviner le type de document"""
     
     def detect(self, text: str) -> str:
-        text = text.lower()
-        
-        # Mots-clés pondérés
-        keywords = {
-            "cv": [
-                "curriculum", "expérience", "experience", "formation", "éducation", 
-                "education", "compétences", "skills", "langues", "profil", "hobbies", 
-                "loisirs", "stage", "freelance", "bachelor", "master", "diplôme"
-            ],
-            "facture": [
-                "facture", "invoice", "devis", "tva", "ht", "ttc", "total", 
-                "siret", "siren", "iban", "bic", "paiement", "échéance", "montant", 
-                "prix unitaire", "qty", "quantité", "article"
-            ],
-            "formulaire": [
-                "formulaire", "cerfa", "demande de", "je soussigné", "signature", 
-                "fait à", "le :", "cocher la case", "réservé à l'administration", 
-                "numéro de dossier", "déclaration", "attestation", "nom :", "prénom :"
-            ]
-        }
-        
+        with METRICS.span("classify"):
+            return self._detect(text)
+
+    def _detect(self, text: str) -> str:
+        found = scan_text(text)
         scores = Counter()
         
-        for category, words in keywords.items():
+        for category, words in DOC_KEYWORDS.items():
             for word in words:
                 # On compte les occurrences (max 5 points par mot pour éviter le spam)
-                count = text.count(word)
-                scores[category] += min(count, 5) 
+                scores[category] += min(found.keywords[word], 5) 
         
         # Bonus contextuels
-        if "total" in text and ("€" in text or "$" in text or "dhs" in text):
+        if found.keywords["total"] and found.has_currency:
             scores["facture"] += 5
         
-        if "linkedin.com" in text or "github.com" in text:
+        if found.has_profile_site:
             scores["cv"] += 5
 
         best_match = scores.most_common(1)[0]
@@ -98,177 +263,1449 @@ class DocumentClassifier:
 class RegexBooster:
     @staticmethod
     def extract_contact_info(text: str) -> Dict[str, Any]:
-        email_pattern = r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}'
-        emails = re.findall(email_pattern, text)
-        
-        phone_pattern = r'(?:\+33|0|\+212)\s*[1-9](?:[\s.-]*\d{2}){4}'
-        phones = re.findall(phone_pattern, text)
-        
-        linkedin_pattern = r'linkedin\.com/in/[a-zA-Z0-9_-]+'
-        linkedins = re.findall(linkedin_pattern, text)
-
+        found = scan_text(text)
         return {
-            "email": emails[0] if emails else None,
-            "telephone": phones[0] if phones else None,
-            "linkedin": linkedins[0] if linkedins else None
+            "email": found.emails[0] if found.emails else None,
+            "telephone": found.phones[0] if found.phones else None,
+            "linkedin": found.linkedins[0] if found.linkedins else None,
+            "iban": found.ibans[0] if found.ibans else None
         }
 
+# --- EXTRACTION PAR RÈGLES (avant LLM) ---
+_RX_NUMERO = re.compile(r"(?:facture|invoice|devis)\s*(?:n[°o]|num[ée]ro|#)\s*[:.]?\s*([A-Z0-9][\w/.-]*\d[\w/-]*)", re.I)
+_RX_DATE = re.compile(r"\b(\d{1,2}[/.-]\d{1,2}[/.-](?:\d{4}|\d{2}))\b")
+_RX_DATE_EMISSION = re.compile(r"date(?: d['e ]\s*(?:émission|facture|facturation))?\s*[:.]?\s*" + _RX_DATE.pattern, re.I)
+_RX_SIRET = re.compile(r"siret\s*(?:n[°o])?\s*[:.]?\s*(\d(?:[ .]?\d){13})\b", re.I)
+_RX_TOTALS = (
+    ("total_ht", re.compile(r"(?:total|montant|sous-total)\s*(?:net\s*)?h\.?t\b", re.I)),
+    ("total_ttc", re.compile(r"(?:total|montant)\s*t\.?t\.?c\b|net à payer", re.I)),
+    ("total_tva", re.compile(r"(?:total\s*|montant\s*)?tva\b(?!\s*intra)", re.I)),
+)
+_RX_CLIENT = re.compile(r"factur[ée] à|client\s*:|destinataire|bill to", re.I)
+_RX_ITEM_COLUMNS = {
+    "description": re.compile(r"désignation|description|article|produit|libellé", re.I),
+    "qte": re.compile(r"qt[ée]|quantité|qty", re.I),
+    "prix_unitaire": re.compile(r"p\.?u\b|prix|unit", re.I),
+    "total_ligne": re.compile(r"total|montant", re.I),
+}
+_RX_PROFILE_LINK = re.compile(r"(?:https?://)?(?:www\.)?(?:linkedin\.com/in/[\w-]+|github\.com/[\w-]+)", re.I)
+# Champ vide par nature quand son libellé n'apparaît nulle part : couvert, sans demander au LLM
+RULE_ABSENT_CUES = {
+    ("emetteur", "siret"): re.compile(r"siret|siren", re.I),
+    ("emetteur", "iban"): re.compile(r"iban|rib\b", re.I),
+    ("candidat", "liens"): re.compile(r"https?:|www\.|linkedin|github", re.I),
+}
+# Indices qu'une ligne d'en-tête nomme bien l'émetteur (et pas "Page 1/2", une URL, "Bon de livraison")
+_RX_LEGAL_FORM = re.compile(r"\b(?:SARL|SASU?|SA|EURL|SNC|SCI|SCOP|SELARL|GmbH|Ltd|LLC|Inc)\b\.?")
+_RX_ISSUER_ID = re.compile(r"siret|siren|\biban\b|\brcs\b|capital", re.I)
+_RX_POSTCODE = re.compile(r"\b\d{5}\b|\b\d+,? (?:rue|avenue|av\.|bd|boulevard|place|chemin|allée)\b", re.I)
+
+class RuleResult(NamedTuple):
+    data: Dict            # champs trouvés, dans la structure du schéma
+    coverage: float       # part des champs du schéma remplis (0-1)
+    missing: Dict         # sous-schéma des champs restant à demander au LLM
+
+def _schema_leaves(schema: Dict, prefix: Tuple = ()) -> List[Tuple]:
+    """Chemins des champs du schéma ; une liste (articles, liens...) compte pour un champ"""
+    leaves = []
+    for key, value in schema.items():
+        if isinstance(value, dict): leaves += _schema_leaves(value, prefix + (key,))
+        else: leaves.append(prefix + (key,))
+    return leaves
+
+def _schema_order(schema: Any, data: Any) -> Any:
+    """Clés dans l'ordre du schéma (puis les éventuelles clés en plus)"""
+    if not isinstance(schema, dict) or not isinstance(data, dict): return data
+    ordered = {k: _schema_order(schema[k], data[k]) for k in schema if k in data}
+    ordered.update((k, v) for k, v in data.items() if k not in ordered)
+    return ordered
+
+def _schema_restrict(schema: Any, data: Any) -> Any:
+    """Ne garde de `data` que les clés présentes dans `schema` (le LLM répond parfois à plus que demandé)"""
+    if not isinstance(schema, dict) or not isinstance(data, dict): return data
+    return {k: _schema_restrict(schema[k], v) for k, v in data.items() if k in schema}
+
+def iban_valid(iban: str) -> bool:
+    """Clé de contrôle modulo 97 : écarte les faux positifs du balayage (ex : n° de TVA 'FR12 345...')"""
+    iban = iban.replace(" ", "").upper()
+    if not 15 <= len(iban) <= 34 or not iban.isalnum(): return False
+    return int("".join(str(int(c, 36)) for c in iban[4:] + iban[:4])) % 97 == 1
+
+_RX_CONTACT_LINE = re.compile(r"@|(?:\+|\b0)\d(?:[ .-]?\d{2}){4}\b")
+_RX_NOT_NAME = re.compile(r"curriculum|vitae|\bcv\b|résumé|\bresume\b|profil|d[ée]velop|ing[ée]nieu|engineer|consultant|"
+                          r"manager|\bchef\b|responsable|directeu|director|analyste|analyst|designer|technicien|stagiaire|"
+                          r"assistant|senior|junior|freelance|[ée]tudiant|student|contact", re.I)
+
+def _is_name(text: str) -> bool:
+    words = text.split()
+    return (2 <= len(words) <= 4 and all(w[0].isupper() for w in words) and not re.search(r"[\d@/:]", text)
+            and not _RX_NOT_NAME.search(text) and not _CUES["cv"].search(text))
+
+class RuleExtractor:
+    """Champs réguliers remplis par regex et règles de mise en page (emails, téléphones, IBAN, SIRET,
+    totaux, dates, tableau d'articles...) avant le LLM, avec la couverture obtenue sur le schéma.
+    Règles volontairement strictes : une valeur trouvée ici n'est plus demandée au LLM."""
+
+    def extract(self, text: str, doc_type: str) -> Optional[RuleResult]:
+        schema = SCHEMAS.get(doc_type)
+        rules = {"facture": self._invoice, "cv": self._cv}.get(doc_type)
+        if schema is None or rules is None: return None
+        with METRICS.span("rules"):
+            lines = [l for l in (" ".join(_INLINE_NOISE.sub(" ", raw.replace("<br>", " ")).split()) for raw in text.splitlines())
+                     if l and not l.startswith(("## PAGE", "--- CONTENU")) and not _NOISE_LINE.match(l)]
+            data = rules(text, lines)
+        leaves = _schema_leaves(schema)
+        missing = {}
+        for path in leaves:
+            node = data
+            for key in path: node = node.get(key) if isinstance(node, dict) else None
+            if not _is_empty(node): continue
+            absent = RULE_ABSENT_CUES.get(path)
+            if absent is not None and not absent.search(text):
+                parent = data
+                for key in path[:-1]: parent = parent.setdefault(key, {})
+                parent[path[-1]] = [] if path == ("candidat", "liens") else ""
+                continue
+            target, source = missing, schema
+            for key in path[:-1]:
+                target, source = target.setdefault(key, {}), source[key]
+            target[path[-1]] = source[path[-1]]
+        filled = len(leaves) - len(_schema_leaves(missing))
+        return RuleResult(data, filled / len(leaves), missing)
+
+    def _invoice(self, text: str, lines: List[str]) -> Dict:
+        found = scan_text(text)
+        low = text.lower()
+        doc = {}
+        kind = re.search(r"\b(facture|invoice|devis)\b", low)
+        if kind: doc["type"] = "Devis" if kind.group(1) == "devis" else "Facture"
+        if m := _RX_NUMERO.search(text): doc["numero"] = m.group(1).rstrip(".")
+        if m := _RX_DATE_EMISSION.search(text): doc["date_emission"] = m.group(1)
+
+        emetteur, client = {}, {}
+        if m := _RX_SIRET.search(text): emetteur["siret"] = re.sub(r"\D", "", m.group(1))
+        iban = next((i for i in found.ibans if iban_valid(i)), None)
+        if iban: emetteur["iban"] = iban
+        # Émetteur : première ligne du document, hors titre / numéro ; adresse dans ses segments suivants.
+        # Nom gardé seulement avec une forme juridique ou un identifiant (SIRET, IBAN, RCS) dans le bloc,
+        # sinon laissé au LLM
+        first = next((l for l in lines[:3] if not re.search(r"factur|invoice|devis|\d{2}[/.]\d{2}", l, re.I)), None)
+        if first:
+            parts = [p.strip(" ,") for p in re.split(r" [—–-] |\|", first.strip("#* ")) if p.strip(" ,")]
+            block = " ".join(lines[lines.index(first):lines.index(first) + 3])
+            issuer = parts and (_RX_LEGAL_FORM.search(parts[0]) or _RX_ISSUER_ID.search(block))
+            if issuer and not _RX_POSTCODE.search(parts[0]): emetteur["nom"] = parts[0]
+            address = [p for p in parts[1:] if _RX_POSTCODE.search(p)]
+            # Sinon, adresse sur les lignes suivantes (rue, code postal)
+            if not address:
+                following = lines[lines.index(first) + 1:lines.index(first) + 3]
+                address = list(itertools.takewhile(lambda l: _RX_POSTCODE.search(l), following))
+            if address: emetteur["adresse"] = ", ".join(address)
+        for i, line in enumerate(lines):
+            m = _RX_CLIENT.search(line)
+            if not m: continue
+            rest = line[m.end():].strip(" :")
+            block = ([rest] if rest else []) + lines[i + 1:i + 4]
+            block = [l for l in block if not (_AMOUNT.search(l) or _RX_CLIENT.search(l) or l.startswith("|"))]
+            if block: client["nom"] = block[0]
+            address = [l for l in block[1:3] if _RX_POSTCODE.search(l) or re.search(r"\d", l)]
+            if address: client["adresse"] = ", ".join(address)
+            break
+
+        # Totaux : dernière ligne portant le libellé (récapitulatif en fin de document), montant qui suit
+        # chaque libellé ("Total HT 1 250,00 | TVA 20 % 250,00 | Total TTC 1 500,00" sur une seule ligne)
+        totaux = {}
+        for line in lines:
+            if line.startswith("|") and line.count("|") > 3: continue
+            labels = sorted((m.start(), m.end(), field) for field, rx in _RX_TOTALS for m in rx.finditer(line))
+            for i, (_, end, field) in enumerate(labels):
+                stop = labels[i + 1][0] if i + 1 < len(labels) else len(line)
+                # Taux ("TVA 5,50 %") écarté : seul le montant compte
+                amount = next((m.group(0) for m in _AMOUNT.finditer(line, end, stop)
+                               if not line[m.end():].lstrip().startswith("%")), None)
+                if amount: totaux[field] = norm_amount(amount)
+        # Totaux incohérents (libellé mal associé, montant mal lu) : laissés au LLM plutôt que figés ici
+        ht, tva, ttc = (totaux.get(k) for k in ("total_ht", "total_tva", "total_ttc"))
+        if None in (ht, ttc) or not totals_match(ht, tva or 0.0, ttc):
+            for k in ("total_ht", "total_tva", "total_ttc"): totaux.pop(k, None)
+        if "€" in text or re.search(r"\beur\b", low): totaux["devise"] = "EUR"
+        elif re.search(r"\b(?:mad|dhs?)\b", low): totaux["devise"] = "MAD"
+        elif "$" in text or re.search(r"\busd\b", low): totaux["devise"] = "USD"
+
+        return {"document": doc, "emetteur": emetteur, "client": client,
+                "articles": self._items(lines), "totaux": totaux}
+
+    @staticmethod
+    def _items(lines: List[str]) -> List[Dict]:
+        """Lignes d'articles d'un tableau Markdown dont l'en-tête nomme désignation / quantité / prix"""
+        items, columns = [], None
+        for line in lines:
+            if not line.startswith("|"):
+                columns = None
+                continue
+            cells = [c.strip() for c in line.strip().strip("|").split("|")]
+            header = {}
+            for field, rx in _RX_ITEM_COLUMNS.items():
+                idx = next((i for i, c in enumerate(cells) if rx.search(c) and i not in header.values()), None)
+                if idx is not None: header[field] = idx
+            if "description" in header and len(header) >= 3 and not any(_AMOUNT.search(c) for c in cells):
+                columns = header
+                continue
+            if columns is None or len(cells) <= max(columns.values()): continue
+            description = cells[columns["description"]]
+            if not description or _RX_TOTALS[0][1].search(description) or re.match(r"total", description, re.I): continue
+            item = {"description": description}
+            for field in ("qte", "prix_unitaire", "total_ligne"):
+                if field in columns: item[field] = norm_amount(cells[columns[field]])
+            if isinstance(item.get("qte"), float) and item["qte"].is_integer(): item["qte"] = int(item["qte"])
+            items.append(item)
+        return items
+
+    def _cv(self, text: str, lines: List[str]) -> Dict:
+        found = scan_text(text)
+        candidat = {}
+        if found.emails: candidat["email"] = found.emails[0]
+        if found.phones: candidat["telephone"] = found.phones[0]
+        links = list(dict.fromkeys(m.group(0) for m in _RX_PROFILE_LINK.finditer(text)))
+        if links: candidat["liens"] = links
+        # Nom : 2 à 4 mots capitalisés sans chiffre, sur la ligne des coordonnées ou les deux au-dessus ;
+        # sinon laissé au LLM (en-tête "CURRICULUM VITAE", intitulé de poste...)
+        contact = next((i for i, l in enumerate(lines[:10]) if _RX_CONTACT_LINE.search(l)), None)
+        if contact is not None:
+            for line in lines[max(0, contact - 2):contact + 1]:
+                name = next((p for p in (p.strip("#*_ ,") for p in re.split(r"[|—–·•]", line)) if _is_name(p)), None)
+                if name:
+                    candidat["nom"] = name
+                    break
+        data = {"candidat": candidat}
+        profile, in_profile = [], False
+        for line in lines:
+            bare = line.strip("#*_: ").strip()
+            if _CV_HEADING.match(line.strip("*_ ")):
+                if in_profile: break
+                in_profile = bool(re.search(SCHEMA_CUES["cv"]["profil_synthese"], bare, re.I))
+            elif in_profile: profile.append(bare)
+        if profile: data["profil_synthese"] = " ".join(profile)
+        return data
+
+class Layout(NamedTuple):
+    box: Tuple[int, int, int, int]           # zone contenant le texte (x0, y0, x1, y1)
+    masks: List[Tuple[int, int, int, int]]   # photos / aplats à blanchir dans cette zone
+
 class ImageProcessor:
+    # Le biais est estimé sur une vignette binarisée, pas sur la page pleine résolution
+    THUMB_SIZE = 1000
+    MAX_SKEW = 15.0
+    # Pré-passe de mise en page : seuil d'encre fixe (Otsu sépare le bruit du papier sur une page blanche)
+    INK_LEVEL = 160
+    MIN_GLYPHS = 8
+
     def preprocess_for_ocr(self, img_pil: Image.Image) -> Image.Image:
-        img = cv2.cvtColor(np.array(img_pil), cv2.COLOR_RGB2BGR)
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        
-        coords = np.column_stack(np.where(gray > 0))
-        angle = cv2.minAreaRect(coords)[-1]
-        if angle < -45: angle = -(90 + angle)
-        else: angle = -angle
+        return Image.fromarray(self.preprocess(np.asarray(img_pil.convert("L"))))
+
+    def preprocess(self, gray: np.ndarray) -> np.ndarray:
+        """Niveaux de gris uint8 -> page redressée et contrastée (une seule rotation, aucune copie couleur)"""
+        angle = self.estimate_skew(gray)
         if abs(angle) > 0.5:
-            (h, w) = img.shape[:2]
+            (h, w) = gray.shape[:2]
             M = cv2.getRotationMatrix2D((w//2, h//2), angle, 1.0)
-            img = cv2.warpAffine(img, M, (w, h), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+            gray = cv2.warpAffine(gray, M, (w, h), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
+
+        # Equivalent de ImageEnhance.Contrast(1.6) : mean + 1.6 * (px - mean)
+        mean = cv2.mean(gray)[0]
+        return cv2.addWeighted(gray, 1.6, gray, 0, -0.6 * mean)
+
+    def estimate_skew(self, gray: np.ndarray) -> float:
+        """Angle (degrés, sens cv2) maximisant la netteté du profil de projection horizontal de l'encre"""
+        thumb, _ = self._thumbnail(gray)
+        _, ink = cv2.threshold(thumb, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+        ys, xs = np.nonzero(ink)
+        if len(ys) < 50: return 0.0
+        xs = xs.astype(np.float32) - thumb.shape[1] / 2
+        ys = ys.astype(np.float32) - thumb.shape[0] / 2
+        n_bins = int(np.hypot(*thumb.shape)) + 2
+
+        def sharpness(deg: float) -> float:
+            # Rotation des seuls pixels d'encre puis histogramme des lignes
+            t = np.deg2rad(deg)
+            rows = (ys * np.cos(t) - xs * np.sin(t) + n_bins / 2).astype(np.int32)
+            profile = np.bincount(rows, minlength=n_bins).astype(np.float64)
+            return float(np.sum(np.diff(profile) ** 2))
+
+        best = max(np.arange(-self.MAX_SKEW, self.MAX_SKEW + 0.5, 1.0), key=sharpness)
+        best = max(np.arange(best - 1.0, best + 1.05, 0.1), key=sharpness)
+        return float(best)
+
+    def _thumbnail(self, gray: np.ndarray) -> Tuple[np.ndarray, float]:
+        """Vignette d'environ THUMB_SIZE px par réduction d'un facteur entier (INTER_AREA ~3x plus rapide)"""
+        factor = -(-max(gray.shape[:2]) // self.THUMB_SIZE)
+        if factor <= 1: return gray, 1.0
+        return cv2.resize(gray, None, fx=1 / factor, fy=1 / factor, interpolation=cv2.INTER_AREA), 1 / factor
+
+    def analyze_layout(self, gray: np.ndarray) -> Optional[Layout]:
+        """Pré-passe vectorisée sur une vignette (composantes connexes) : None pour une page blanche,
+        sinon la zone englobant le texte et les grandes zones denses (photos) à ne pas envoyer à Tesseract"""
+        full = (0, 0, gray.shape[1], gray.shape[0])
+        thumb, scale = self._thumbnail(gray)
+        ink = (thumb < self.INK_LEVEL).astype(np.uint8)
+        # Page sombre ou inversée : on ne sait pas isoler le texte, page entière
+        if ink.mean() > 0.5: return Layout(full, [])
+
+        _, _, stats, _ = cv2.connectedComponentsWithStats(ink, connectivity=8)
+        x, y, w, h, area = (stats[1:, i] for i in range(5))
+        (th, tw) = thumb.shape
+        glyphs = (h >= 3) & (area >= 4) & (h <= th * 0.1) & (w <= tw * 0.5)
+        if glyphs.sum() < self.MIN_GLYPHS: return None
 
-        pil_img = Image.fromarray(gray)
-        enhancer = ImageEnhance.Contrast(pil_img)
-        return enhancer.enhance(1.6)
+        pad = 8
+        x0, y0 = max(0, x[glyphs].min() - pad), max(0, y[glyphs].min() - pad)
+        x1, y1 = min(tw, (x + w)[glyphs].max() + pad), min(th, (y + h)[glyphs].max() + pad)
+        # Photos : grandes composantes denses (un cadre de tableau est grand mais peu rempli)
+        photos = (w * h >= 0.02 * th * tw) & (area >= 0.35 * w * h)
+        to_full = lambda *v: tuple(int(round(c / scale)) for c in v)
+        masks = [to_full(px, py, px + pw, py + ph) for px, py, pw, ph in zip(x[photos], y[photos], w[photos], h[photos])
+                 if px < x1 and py < y1 and px + pw > x0 and py + ph > y0]
+        box = to_full(x0, y0, x1, y1)
+        return Layout((box[0], box[1], min(box[2], full[2]), min(box[3], full[3])), masks)
+
+    def estimate_text_height(self, gray: np.ndarray) -> Optional[float]:
+        """Hauteur médiane (px) des composantes connexes de taille « caractère », None sans texte"""
+        _, ink = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+        n, _, stats, _ = cv2.connectedComponentsWithStats(ink, connectivity=8)
+        w, h, area = stats[1:, cv2.CC_STAT_WIDTH], stats[1:, cv2.CC_STAT_HEIGHT], stats[1:, cv2.CC_STAT_AREA]
+        # Ni bruit, ni filets horizontaux, ni illustrations
+        glyphs = h[(h >= 2) & (area >= 3) & (w <= 5 * h) & (h <= gray.shape[0] / 10)]
+        if len(glyphs) < 20: return None
+        return float(np.median(glyphs))
+
+class OCREngine:
+    """Interface des moteurs OCR : page en niveaux de gris (numpy uint8) -> texte"""
+    name = ""
+
+    def __init__(self, lang: str = OCR_LANG):
+        self.lang = lang
+
+    def image_to_text(self, gray: np.ndarray, psm: Optional[int] = None) -> str:
+        raise NotImplementedError
+
+    def image_to_text_conf(self, gray: np.ndarray, psm: Optional[int] = None) -> Tuple[str, Optional[float]]:
+        """Texte + confiance moyenne des mots (0-100), None si le moteur ne la fournit pas"""
+        return self.image_to_text(gray, psm), None
+
+class PytesseractEngine(OCREngine):
+    """Moteur historique : un processus tesseract (et un PNG temporaire) par appel"""
+    name = "pytesseract"
+
+    def image_to_text(self, gray: np.ndarray, psm: Optional[int] = None) -> str:
+        config = f'--psm {psm}' if psm is not None else ''
+        if TESSERACT_CMD: pytesseract.pytesseract.tesseract_cmd = TESSERACT_CMD
+        return pytesseract.image_to_string(Image.fromarray(gray), lang=self.lang, config=config)
+
+    def image_to_text_conf(self, gray: np.ndarray, psm: Optional[int] = None) -> Tuple[str, Optional[float]]:
+        # Un seul passage tesseract (TSV) : le texte est reconstitué ligne par ligne, paragraphes séparés
+        config = f'--psm {psm}' if psm is not None else ''
+        if TESSERACT_CMD: pytesseract.pytesseract.tesseract_cmd = TESSERACT_CMD
+        data = pytesseract.image_to_data(Image.fromarray(gray), lang=self.lang, config=config,
+                                         output_type=pytesseract.Output.DICT)
+        parts, confs, prev = [], [], None
+        for i, word in enumerate(data["text"]):
+            conf = float(data["conf"][i])
+            if conf < 0 or not word.strip(): continue
+            key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+            if prev is not None: parts.append(" " if key == prev else "\n" if key[:2] == prev[:2] else "\n\n")
+            parts.append(word)
+            confs.append(conf)
+            prev = key
+        return "".join(parts), (sum(confs) / len(confs) if confs else 0.0)
+
+class TesserocrEngine(OCREngine):
+    """libtesseract en processus via tesserocr : modèles chargés une seule fois,
+    buffers numpy transmis directement, sans fichier temporaire"""
+    name = "tesserocr"
+
+    def __init__(self, lang: str = OCR_LANG):
+        super().__init__(lang)
+        try:
+            import tesserocr
+        except ImportError:
+            raise RuntimeError("Moteur 'tesserocr' indisponible : pip install tesserocr")
+        self._api = tesserocr.PyTessBaseAPI(lang=lang)
+        self._default_psm = tesserocr.PSM.AUTO
+        self._lock = threading.Lock()  # une instance de l'API ne traite qu'une image à la fois
+
+    def image_to_text(self, gray: np.ndarray, psm: Optional[int] = None) -> str:
+        return self.image_to_text_conf(gray, psm)[0]
+
+    def image_to_text_conf(self, gray: np.ndarray, psm: Optional[int] = None) -> Tuple[str, Optional[float]]:
+        gray = np.ascontiguousarray(gray)
+        (h, w) = gray.shape
+        with self._lock:
+            self._api.SetPageSegMode(psm if psm is not None else self._default_psm)
+            self._api.SetImageBytes(gray.tobytes(), w, h, 1, w)
+            return self._api.GetUTF8Text(), float(self._api.MeanTextConf())
+
+OCR_ENGINES = {engine.name: engine for engine in (PytesseractEngine, TesserocrEngine)}
+
+def make_ocr_engine(name: str = "pytesseract") -> OCREngine:
+    if name not in OCR_ENGINES: raise ValueError(f"Moteur OCR inconnu : {name}")
+    return OCR_ENGINES[name]()
+
+def _render_page(page: "fitz.Page", dpi: int = OCR_DPI) -> np.ndarray:
+    """Rendu direct en niveaux de gris (aucune conversion couleur ensuite)"""
+    pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, alpha=False)
+    return np.frombuffer(pix.samples, np.uint8).reshape(pix.height, pix.stride)[:, :pix.width]
+
+def iter_pdf_pages(pdf_path: Path, page_nos: Optional[List[int]] = None, dpi: int = OCR_DPI) -> Iterator[Tuple[int, np.ndarray]]:
+    """Rend les pages une par une (page_no, image) : une seule page en mémoire à la fois"""
+    with fitz.open(str(pdf_path)) as doc:
+        for page_no in page_nos or range(1, doc.page_count + 1):
+            yield page_no, _render_page(doc[page_no - 1], dpi)
+
+class PageOCR(NamedTuple):
+    text: str
+    timings: Dict[str, float]
+    dpi: int
+    confidence: Optional[float] = None
+    rerendered: bool = False
+    # Pixels de la page au DPI retenu / effectivement envoyés à Tesseract (0 : page blanche)
+    pixels: int = 0
+    ocr_pixels: int = 0
+    blank: bool = False
+
+def choose_dpi(gray: np.ndarray, src_dpi: int, processor: "ImageProcessor") -> Optional[int]:
+    """DPI amenant le texte à TARGET_TEXT_PX pixels, mesuré sur une réduction à PROBE_DPI (None : pas de texte vu)"""
+    height = processor.estimate_text_height(_resize_dpi(gray, src_dpi, PROBE_DPI))
+    if not height: return None
+    dpi = PROBE_DPI * TARGET_TEXT_PX / height
+    return int(min(MAX_DPI, max(MIN_DPI, round(dpi / 25) * 25)))
+
+def _resize_dpi(gray: np.ndarray, src_dpi: int, dst_dpi: int) -> np.ndarray:
+    # Réduire un rendu existant coûte bien moins cher qu'un nouveau rendu MuPDF hors résolution native du scan.
+    # INTER_AREA est lent pour un facteur non entier : linéaire pour les réductions modérées
+    scale = dst_dpi / src_dpi
+    interpolation = cv2.INTER_LINEAR if scale > 0.5 else cv2.INTER_AREA
+    return cv2.resize(gray, None, fx=scale, fy=scale, interpolation=interpolation)
+
+def _apply_layout(gray: np.ndarray, layout: Optional[Layout], scale: float = 1.0) -> np.ndarray:
+    """Découpe la zone de texte (vue numpy, sans copie) et blanchit les photos qu'elle contient"""
+    if layout is None: return gray
+    x0, y0, x1, y1 = (int(round(v * scale)) for v in layout.box)
+    crop = gray[y0:y1, x0:x1]
+    if layout.masks:
+        crop = crop.copy()  # le rendu MuPDF est en lecture seule
+        for mx0, my0, mx1, my1 in layout.masks:
+            crop[max(0, int(my0 * scale) - y0):max(0, int(my1 * scale) - y0),
+                 max(0, int(mx0 * scale) - x0):max(0, int(mx1 * scale) - x0)] = 255
+    return crop
+
+def _ocr_image(gray: np.ndarray, engine: OCREngine, processor: "ImageProcessor",
+               timings: Dict[str, float], with_conf: bool = False) -> Tuple[str, Optional[float]]:
+    """Prétraitement (redressement, contraste) + OCR ; durées cumulées dans `timings`"""
+    t0 = time.perf_counter()
+    processed = processor.preprocess(gray)
+    t1 = time.perf_counter()
+    if with_conf: text, conf = engine.image_to_text_conf(processed, psm=OCR_PSM)
+    else: text, conf = engine.image_to_text(processed, psm=OCR_PSM), None
+    timings["preprocess"] = timings.get("preprocess", 0.0) + t1 - t0
+    timings["tesseract"] = timings.get("tesseract", 0.0) + time.perf_counter() - t1
+    return text, conf
+
+def _ocr_page(page: "fitz.Page", engine: OCREngine, processor: "ImageProcessor", dpi=OCR_DPI,
+              layout: bool = True) -> PageOCR:
+    """OCR d'une page, à DPI fixe ou adaptatif (dpi=ADAPTIVE_DPI), avec la durée de chaque étape.
+    Avec `layout`, les pages blanches sont ignorées et seule la zone de texte part vers Tesseract."""
+    adaptive = dpi == ADAPTIVE_DPI
+    base_dpi = OCR_DPI if adaptive else dpi
+    t = time.perf_counter()
+    base = _render_page(page, base_dpi)
+    timings = {"render": time.perf_counter() - t}
+
+    t = time.perf_counter()
+    regions = processor.analyze_layout(base) if layout else Layout((0, 0, base.shape[1], base.shape[0]), [])
+    timings["layout"] = time.perf_counter() - t
+    if regions is None: return PageOCR("", timings, base_dpi, pixels=base.size, blank=True)
+    crop = _apply_layout(base, regions)
+
+    def result(text: str, dpi: int, img: np.ndarray, **kw) -> PageOCR:
+        return PageOCR(text, timings, dpi, pixels=int(base.size * (dpi / base_dpi) ** 2), ocr_pixels=img.size, **kw)
+
+    if not adaptive:
+        return result(_ocr_image(crop, engine, processor, timings)[0], dpi, crop)
+
+    # Sonde et réduction à partir du rendu OCR_DPI ; nouveau rendu seulement pour monter au-dessus
+    t = time.perf_counter()
+    chosen = choose_dpi(crop, OCR_DPI, processor) or OCR_DPI
+    if OCR_DPI * 0.85 <= chosen < OCR_DPI: chosen = OCR_DPI  # gain trop faible pour un rééchantillonnage
+    img = crop if chosen == OCR_DPI else _resize_dpi(crop, OCR_DPI, chosen) if chosen < OCR_DPI else None
+    timings["probe"] = time.perf_counter() - t
+    if img is None:
+        t = time.perf_counter()
+        img = _apply_layout(_render_page(page, chosen), regions, chosen / OCR_DPI)
+        timings["render"] += time.perf_counter() - t
+    text, conf = _ocr_image(img, engine, processor, timings, with_conf=True)
+    if conf is None or conf >= MIN_CONFIDENCE or chosen == MAX_DPI:
+        return result(text, chosen, img, confidence=conf)
+
+    # Confiance faible : second passage plus fin (rendu OCR_DPI déjà en mémoire, ou MAX_DPI), on garde le meilleur
+    retry = OCR_DPI if chosen < OCR_DPI else MAX_DPI
+    if retry == OCR_DPI:
+        img2 = crop
+    else:
+        t = time.perf_counter()
+        img2 = _apply_layout(_render_page(page, retry), regions, retry / OCR_DPI)
+        timings["render"] += time.perf_counter() - t
+    text2, conf2 = _ocr_image(img2, engine, processor, timings, with_conf=True)
+    if conf2 >= conf: text, conf, chosen, img = text2, conf2, retry, img2
+    return result(text, chosen, img, confidence=conf, rerendered=True)
+
+# Moteur OCR propre à chaque worker du pool, créé au premier appel puis réutilisé
+_WORKER_ENGINES: Dict[str, OCREngine] = {}
+
+def warm_worker(engine_name: str = "pytesseract"):
+    """Initialiseur de pool : le moteur OCR (et ses modèles) est prêt avant la première page"""
+    if engine_name not in _WORKER_ENGINES: _WORKER_ENGINES[engine_name] = make_ocr_engine(engine_name)
+
+def _ocr_pdf_page(pdf_path: str, page_no: int, engine_name: str = "pytesseract", dpi=OCR_DPI,
+                  layout: bool = True) -> Tuple[int, PageOCR]:
+    """Rastérise et OCRise une seule page (exécuté dans un worker du pool)"""
+    warm_worker(engine_name)
+    with fitz.open(pdf_path) as doc:
+        return page_no, _ocr_page(doc[page_no - 1], _WORKER_ENGINES[engine_name], ImageProcessor(), dpi, layout)
 
 class SmartExtractor:
-    def __init__(self):
+    def __init__(self, executor: Optional[Executor] = None, cache: Optional[ExtractionCache] = None,
+                 engine: Optional[OCREngine] = None, dpi=OCR_DPI, layout: bool = True):
         self.img_processor = ImageProcessor()
+        self.engine = engine or PytesseractEngine()
+        # DPI de rendu des pages scannées : entier fixe ou ADAPTIVE_DPI
+        self.dpi = dpi
+        # Pré-passe de mise en page : pages blanches ignorées, OCR limité à la zone de texte
+        self.layout = layout
+        self.stats = Counter()
+        self._stats_lock = threading.Lock()
+        # Pool optionnel : les pages OCR sont alors réparties sur plusieurs processus
+        self.executor = executor
+        self.cache = cache
     
+    @property
+    def params(self) -> Dict[str, Any]:
+        """Paramètres qui déterminent le texte extrait (clé de cache, manifeste du mode lot)"""
+        return dict(dpi=self.dpi, lang=OCR_LANG, psm=OCR_PSM, preprocess=PREPROCESS_VERSION,
+                    native_min_chars=NATIVE_MIN_CHARS, engine=self.engine.name, layout=self.layout)
+
     def extract(self, file_path: Path, progress_callback=None) -> str:
+        with METRICS.span("extract"):
+            return self._extract_cached(file_path, progress_callback)
+
+    def _extract_cached(self, file_path: Path, progress_callback=None) -> str:
+        if self.cache is None: return self._extract(file_path, progress_callback)
+        key = self.cache.key_for(file_path, **self.params)
+        cached = self.cache.get(key)
+        if cached is not None:
+            METRICS.inc("cache_hits", cache="extract")
+            logger.info(f"♻️ Extraction en cache : {file_path.name}")
+            if progress_callback: progress_callback(1.0, "Extraction récupérée du cache")
+            return cached
+        METRICS.inc("cache_misses", cache="extract")
+        text = self._extract(file_path, progress_callback)
+        self.cache.put(key, text)
+        return text
+
+    def _extract(self, file_path: Path, progress_callback=None) -> str:
         ext = file_path.suffix.lower()
         if ext == '.pdf': return self._handle_pdf(file_path, progress_callback)
-        elif ext in ['.jpg', '.png', '.jpeg']: return self._handle_image(file_path, progress_callback)
+        elif ext in SUPPORTED_EXTS: return self._handle_image(file_path, progress_callback)
         else: raise ValueError(f"Format non supporté: {ext}")
 
     def _handle_pdf(self, pdf_path: Path, progress_callback=None) -> str:
+        logger.info(f"📄 Traitement PDF : {pdf_path.name}")
+        if progress_callback: progress_callback(0.1, "Lecture PDF (Markdown)...")
+        # Décision native / OCR page par page, sur la densité de texte de la couche PDF
+        with fitz.open(str(pdf_path)) as doc:
+            total = doc.page_count
+            native = [page.number + 1 for page in doc if len(re.sub(r'\s+', '', page.get_text())) > NATIVE_MIN_CHARS]
+            pages = self._native_pages(doc, native)
+
+        scanned = [n for n in range(1, total + 1) if n not in pages]
+        METRICS.inc("pages", len(pages), mode="native")
+        METRICS.inc("pages", len(scanned), mode="ocr")
+        if not scanned:
+            logger.info(f"✅ Extraction native réussie ({total} pages)")
+            if progress_callback: progress_callback(1.0, "Extraction Markdown terminée")
+            return "--- CONTENU MARKDOWN ---\n" + "".join(pages[n] for n in sorted(pages))
+
+        if pages: logger.warning(f"⚠️ {len(scanned)}/{total} pages sans texte natif, OCR ciblé...")
+        else: logger.warning("⚠️ Contenu insuffisant, bascule vers OCR...")
+        METRICS.inc("ocr_fallbacks")
+        pages.update(self._ocr_fallback(pdf_path, scanned, progress_callback))
+        return "\n".join(f"## PAGE {n}\n{pages[n]}" for n in sorted(pages))
+
+    def _native_pages(self, doc: "fitz.Document", page_nos: List[int]) -> Dict[int, str]:
+        if not page_nos: return {}
         try:
-            logger.info(f"📄 Traitement PDF : {pdf_path.name}")
-            if progress_callback: progress_callback(0.1, "Lecture PDF (Markdown)...")
-            md_text = pymupdf4llm.to_markdown(str(pdf_path))
-            
-            if len(re.sub(r'\s+', '', md_text)) > 50:
-                logger.info("✅ Extraction native réussie (>50 chars)")
-                if progress_callback: progress_callback(1.0, "Extraction Markdown terminée")
-                return f"--- CONTENU MARKDOWN ---\n{md_text}"
-            
-            logger.warning("⚠️ Contenu insuffisant, bascule vers OCR...")
-            return self._ocr_fallback(pdf_path, progress_callback)
+            with METRICS.span("native"):
+                chunks = pymupdf4llm.to_markdown(doc, pages=[n - 1 for n in page_nos], page_chunks=True)
+            return {n: chunk["text"] for n, chunk in zip(page_nos, chunks)}
         except Exception as e:
+            # Les pages concernées passent simplement par l'OCR, sans relire le document
             logger.error(f"❌ Erreur lecture native : {e}")
-            return self._ocr_fallback(pdf_path, progress_callback)
+            return {}
 
-    def _ocr_fallback(self, pdf_path: Path, progress_callback=None) -> str:
+    def _ocr_fallback(self, pdf_path: Path, page_nos: List[int], progress_callback=None) -> Dict[int, str]:
+        if self.executor is not None:
+            return self._ocr_parallel(pdf_path, page_nos, progress_callback)
         logger.info("📷 Démarrage OCR (Tesseract / PyMuPDF)...")
         if progress_callback: progress_callback(0.2, "Conversion PDF -> Images...")
-        images = convert_from_path(str(pdf_path), dpi=300)
-        total = len(images)
+        total = len(page_nos)
         logger.info(f"🖼️ {total} pages à traiter")
-        full_text = []
+        pages = {}
         
-        for i, img in enumerate(images):
-            if progress_callback: 
-                prog = 0.2 + (0.6 * (i / total))
-                progress_callback(prog, f"OCR Page {i+1}/{total}...")
-            
-            logger.info(f"   Utilization Page {i+1}/{total}...")    
-            processed = self.img_processor.preprocess_for_ocr(img)
-            txt = pytesseract.image_to_string(processed, lang='fra+eng', config='--psm 4')
-            full_text.append(f"## PAGE {i+1}\n{txt}")
+        with fitz.open(str(pdf_path)) as doc:
+            for i, page_no in enumerate(page_nos):
+                if progress_callback: 
+                    prog = 0.2 + (0.6 * (i / total))
+                    progress_callback(prog, f"OCR Page {i+1}/{total}...")
+                
+                logger.info(f"   Utilization Page {page_no} ({i+1}/{total})...")    
+                pages[page_no] = self._record_page(page_no, _ocr_page(doc[page_no - 1], self.engine, self.img_processor, self.dpi, self.layout))
             
         logger.info("✨ OCR terminé")
         if progress_callback: progress_callback(0.8, "Assemblage du texte...")
-        return "\n".join(full_text)
+        return pages
+
+    def _ocr_parallel(self, pdf_path: Path, page_nos: List[int], progress_callback=None) -> Dict[int, str]:
+        total = len(page_nos)
+        logger.info(f"📷 Démarrage OCR parallèle : {total} pages")
+        if progress_callback: progress_callback(0.2, "Répartition des pages...")
+        futures = [self.executor.submit(_ocr_pdf_page, str(pdf_path), n, self.engine.name, self.dpi, self.layout)
+                   for n in page_nos]
+        pages = {}
+        for done, fut in enumerate(as_completed(futures), 1):
+            page_no, result = fut.result()
+            pages[page_no] = self._record_page(page_no, result)
+            if progress_callback: progress_callback(0.2 + 0.6 * (done / total), f"OCR Page {done}/{total}...")
+
+        logger.info("✨ OCR terminé")
+        if progress_callback: progress_callback(0.8, "Assemblage du texte...")
+        return pages
+
+    def _record_page(self, page_no: int, result: PageOCR) -> str:
+        METRICS.observe_page(page_no, result.timings)
+        skipped = result.pixels if result.blank else 0
+        cropped = 0 if result.blank else result.pixels - result.ocr_pixels
+        with self._stats_lock:
+            self.stats.update(ocr_pages=1, blank_pages=int(result.blank), pixels=result.pixels,
+                              skipped_pixels=skipped, cropped_pixels=cropped)
+        METRICS.inc("ocr_pixels", result.pixels, kind="page")
+        METRICS.inc("ocr_pixels", result.ocr_pixels, kind="tesseract")
+        METRICS.inc("ocr_pixels", skipped, kind="blank")
+        METRICS.inc("ocr_pixels", cropped, kind="cropped")
+        if result.blank:
+            METRICS.inc("ocr_blank_pages")
+            logger.info(f"   ⬜ Page {page_no} blanche : ignorée")
+        if result.rerendered:
+            METRICS.inc("ocr_rerenders")
+            logger.info(f"   🔁 Page {page_no} : confiance faible, re-rendue (gardé : {result.dpi} dpi, {result.confidence:.0f}%)")
+        return result.text
 
     def _handle_image(self, img_path: Path, progress_callback=None) -> str:
         logger.info(f"🖼️ Traitement Image : {img_path.name}")
         if progress_callback: progress_callback(0.3, "Prétraitement image...")
-        img = Image.open(img_path)
-        processed = self.img_processor.preprocess_for_ocr(img)
+        METRICS.inc("pages", mode="ocr")
+        t = time.perf_counter()
+        img = np.asarray(Image.open(img_path).convert("L"))
+        timings = {"render": time.perf_counter() - t}
+        t = time.perf_counter()
+        regions = self.img_processor.analyze_layout(img) if self.layout else None
+        timings["layout"] = time.perf_counter() - t
+        if self.layout and regions is None:
+            self._record_page(1, PageOCR("", timings, 0, pixels=img.size, blank=True))
+            return ""
+        crop = _apply_layout(img, regions)
         
         logger.info("🔍 Lancement Tesseract...")
         if progress_callback: progress_callback(0.5, "OCR en cours...")
-        txt = pytesseract.image_to_string(processed, lang='fra+eng')
+        t = time.perf_counter()
+        processed = self.img_processor.preprocess(crop)
+        timings["preprocess"] = time.perf_counter() - t
+        t = time.perf_counter()
+        txt = self.engine.image_to_text(processed)
+        timings["tesseract"] = time.perf_counter() - t
+        self._record_page(1, PageOCR(txt, timings, 0, pixels=img.size, ocr_pixels=crop.size))
         
         logger.info("✅ Extraction terminée")
         if progress_callback: progress_callback(1.0, "Extraction image terminée")
         return txt
 
+def estimate_tokens(text: str) -> int:
+    return int(len(text) / CHARS_PER_TOKEN) + 1
+
+def split_markdown(text: str, max_tokens: int) -> List[str]:
+    """Découpe sur les frontières de pages / sections, puis de paragraphes, sous un budget de tokens"""
+    max_chars = int(max_tokens * CHARS_PER_TOKEN)
+    sections = [s for s in re.split(r'\n(?=## PAGE \d+|#{1,6} )', text) if s.strip()]
+    pieces = []
+    for section in sections:
+        if len(section) <= max_chars:
+            pieces.append(section)
+            continue
+        for para in re.split(r'\n\s*\n', section):
+            # Dernier recours : coupe franche d'un paragraphe trop long
+            pieces.extend(para[i:i + max_chars] for i in range(0, len(para), max_chars))
+
+    chunks, current = [], ""
+    for piece in pieces:
+        if current and len(current) + len(piece) + 1 > max_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n{piece}" if current else piece
+    if current: chunks.append(current)
+    return chunks
+
+def _is_empty(value: Any) -> bool:
+    if isinstance(value, dict): return all(_is_empty(v) for v in value.values())
+    if isinstance(value, list): return all(_is_empty(v) for v in value)
+    return value in (None, "", 0)
+
+def merge_json(a: Any, b: Any) -> Any:
+    """Fusion de deux JSON partiels : dicts récursifs, listes concaténées sans doublons,
+    scalaires = première valeur non vide"""
+    if isinstance(a, dict) and isinstance(b, dict):
+        out = dict(a)
+        for k, v in b.items():
+            out[k] = merge_json(out[k], v) if k in out else v
+        return out
+    if isinstance(a, list) and isinstance(b, list):
+        out, seen = [], set()
+        for item in a + b:
+            key = json.dumps(item, sort_keys=True, ensure_ascii=False)
+            if key in seen or _is_empty(item): continue
+            seen.add(key)
+            out.append(item)
+        return out
+    return b if _is_empty(a) else a
+
+# --- VALIDATION D'UN RÉSULTAT (routage petit modèle -> modèle principal) ---
+# Champs sans lesquels le résultat n'est pas exploitable (chemins pointés)
+REQUIRED_FIELDS = {
+    "facture": ["document.numero", "emetteur.nom", "totaux.total_ttc"],
+    "cv": ["candidat.nom", "experience"],
+    "formulaire": ["titre_formulaire", "champs_reemplis"],
+    "generique": ["resume"],
+}
+# Écart toléré entre HT + TVA et TTC : 0,5 % (arrondis de TVA ligne à ligne), au moins 2 centimes
+TOTALS_TOLERANCE = 0.005
+
+def totals_match(ht: float, tva: float, ttc: float) -> bool:
+    return abs(ht + tva - ttc) <= max(0.02, TOTALS_TOLERANCE * abs(ttc))
+
+def _dotted(data: Any, path: str) -> Any:
+    for key in path.split("."):
+        if not isinstance(data, dict): return None
+        data = data.get(key)
+    return data
+
+def validate_result(data: Dict, raw_text: str, doc_type: str) -> List[str]:
+    """Contrôles d'un résultat LLM -> problèmes trouvés (liste vide : résultat accepté).
+    Champs requis remplis, HT + TVA ≈ TTC, et email / téléphone / IBAN bien présents dans le texte."""
+    if "error" in data: return [f"réponse inexploitable ({data['error']})"]
+    issues = [f"{path} vide" for path in REQUIRED_FIELDS.get(doc_type, REQUIRED_FIELDS["generique"])
+              if _is_empty(_dotted(data, path))]
+    if doc_type == "facture":
+        ht, tva, ttc = (norm_amount(_dotted(data, f"totaux.{k}")) for k in ("total_ht", "total_tva", "total_ttc"))
+        if None not in (ht, tva, ttc) and ttc and not totals_match(ht, tva, ttc):
+            issues.append(f"HT + TVA ≠ TTC ({ht:g} + {tva:g} ≠ {ttc:g})")
+    # Valeurs de contact recopiées du texte : absentes du texte, elles sont inventées ou mal lues
+    section = "candidat" if doc_type == "cv" else "emetteur"
+    email, phone, iban = (_dotted(data, f"{section}.{k}") for k in ("email", "telephone", "iban"))
+    if isinstance(email, str) and "@" in email and email.strip().lower() not in raw_text.lower():
+        issues.append(f"email absent du texte ({email})")
+    digits = re.sub(r"\D", "", str(phone or ""))
+    if len(digits) >= 9 and digits[-9:] not in re.sub(r"\D", "", raw_text):
+        issues.append(f"téléphone absent du texte ({phone})")
+    iban = re.sub(r"\s", "", str(iban or "")).upper()
+    if len(iban) >= 15 and iban not in re.sub(r"\s", "", raw_text).upper():
+        issues.append("IBAN absent du texte")
+    return issues
+
+# --- RÉDUCTION DU TEXTE AVANT LLM ---
+# Indices textuels des champs de SCHEMAS. Facture : une ligne qui en contient un est gardée ;
+# CV : un titre de section qui en contient un garde toute la section.
+SCHEMA_CUES = {
+    "facture": {
+        "document": r"factur|invoice|devis|n[°o] ?\d|num[ée]ro|date|échéance",
+        "emetteur": r"siret|siren|iban|bic|rib|tva intra|capital|rcs|ice\b",
+        "client": r"client|factur[ée] à|destinataire|bill to|livraison",
+        "articles": r"désignation|description|qt[ée]|quantité|prix unitaire|référence",
+        "totaux": r"total|montant|net à payer|tva|\bht\b|ttc|remise|acompte|[€$]|\b(?:eur|usd|mad|dhs?)\b",
+    },
+    "cv": {
+        "candidat": r"contact|coordonnées",
+        "profil_synthese": r"profil|résumé|à propos|about|objectif|summary",
+        "competences": r"compétences|skills|langages|outils|technologies|langues|languages",
+        "experience": r"expériences?|parcours|stages?|projets?|employment|work",
+        "education": r"formations?|éducation|education|diplômes?|études|cursus|certifications?",
+    },
+}
+_CUES = {t: re.compile("|".join(cues.values()), re.I) for t, cues in SCHEMA_CUES.items()}
+# Après un titre client / émetteur, les lignes d'adresse n'ont pas d'indice propre
+_ADDRESS_CUE = re.compile(SCHEMA_CUES["facture"]["client"] + r"|émetteur|vendeur|fournisseur", re.I)
+_AMOUNT = re.compile(r"\d[\d \u00a0.]*[.,]\d{2}\b")
+_IDENT = re.compile(r"\b[A-Z]{2}\d{2}(?: ?[A-Z0-9]{4}){2,}|\d{3} ?\d{3} ?\d{3}(?: ?\d{5})?\b")
+_INLINE_NOISE = re.compile(r"\*\*|</?su[bp]>|(?: ?\.){4,}")
+_NOISE_LINE = re.compile(r"^[\s|:\-=_.*#·•]*$|intentionally omitted")
+_CV_HEADING = re.compile(r"^(?:#{1,6} .*|[^a-z]{3,40}|.{3,40}:)$")
+INVOICE_HEADER_LINES = 12
+INVOICE_ADDRESS_LINES = 3
+
+class PrunedText(NamedTuple):
+    text: str
+    tokens_before: int
+    tokens_after: int
+
+def _clean_lines(text: str) -> List[str]:
+    """Bruit de mise en page (gras, <br>, points de conduite, filets, séparateurs de tableau) et
+    en-têtes / pieds de page répétés : une ligne revenant 3 fois ou plus (chiffres ignorés,
+    ex : 'Page 2/9') n'est gardée qu'à sa première occurrence, sauf titre, ligne de tableau ou montant"""
+    lines, blank = [], False
+    for line in text.splitlines():
+        line = " ".join(_INLINE_NOISE.sub(" ", line.replace("<br>", " ")).split())
+        if _NOISE_LINE.match(line):
+            # Une seule ligne vide entre deux paragraphes
+            if not blank and lines: lines.append("")
+            blank = True
+            continue
+        lines.append(line)
+        blank = False
+
+    norm = [re.sub(r"\d+", "0", l.lower()) for l in lines]
+    counts = Counter(n for n, l in zip(norm, lines) if l and l[0] not in "|#" and not _AMOUNT.search(l))
+    seen, out = set(), []
+    for n, line in zip(norm, lines):
+        if counts.get(n, 0) >= 3:
+            if n in seen: continue
+            seen.add(n)
+        out.append(line)
+    return out
+
+def _invoice_lines(lines: List[str]) -> Tuple[List[str], List[int]]:
+    """En-tête, lignes portant un champ du schéma (montants, devise, IBAN/SIRET, numéro, dates),
+    lignes de tableau et blocs d'adresse -> (lignes, priorités pour le budget : 0 montants et
+    identifiants, 1 en-tête et indices, 2 contexte)"""
+    kept, prio, header, address = [], [], 0, 0
+    for line in lines:
+        if not line: continue
+        if _AMOUNT.search(line) or _IDENT.search(line): rank = 0
+        # Un indice dans une phrase ('merci pour votre facture') ne porte pas de champ
+        elif header < INVOICE_HEADER_LINES or (len(line) <= 80 and _CUES["facture"].search(line)): rank = 1
+        elif address or line.startswith("|"): rank = 2
+        else: rank = None
+        if rank is not None:
+            kept.append(line)
+            prio.append(rank)
+        header += 1
+        address = INVOICE_ADDRESS_LINES if _ADDRESS_CUE.search(line) else max(0, address - 1)
+    return kept, prio
+
+def _cv_lines(lines: List[str]) -> List[str]:
+    """En-tête (nom, contacts : tout ce qui précède la première section reconnue) + sections dont
+    le titre correspond au schéma ; sans titre reconnu, le texte est gardé tel quel"""
+    kept, keep, matched = [], True, False
+    for line in lines:
+        bare = line.strip("#*_: ").strip()
+        if bare and _CV_HEADING.match(line.strip("*_ ")):
+            section = bool(_CUES["cv"].search(bare))
+            keep = section or not matched
+            matched |= section
+        if keep: kept.append(line)
+    return kept if matched else lines
+
+def _fit_budget(lines: List[str], priorities: List[int], max_chars: int) -> List[str]:
+    """Garde les lignes par priorité puis dans l'ordre du texte, sous le budget ; ordre d'origine conservé"""
+    keep, used = set(), 0
+    for i in sorted(range(len(lines)), key=lambda i: (priorities[i], i)):
+        if used + len(lines[i]) + 1 > max_chars: continue
+        used += len(lines[i]) + 1
+        keep.add(i)
+    return [line for i, line in enumerate(lines) if i in keep]
+
+def prune_for_schema(text: str, doc_type: str, budget_tokens: Optional[int] = None) -> PrunedText:
+    """Réduit le texte envoyé au LLM aux parties utiles au schéma cible (le préremplissage du prompt
+    domine la latence sur CPU). Les entités du RegexBooster restent cherchées dans le texte complet."""
+    lines, priorities = _clean_lines(text), None
+    if doc_type == "facture": lines, priorities = _invoice_lines(lines)
+    elif doc_type == "cv": lines = _cv_lines(lines)
+    if budget_tokens and estimate_tokens("\n".join(lines)) > budget_tokens:
+        lines = _fit_budget(lines, priorities or [0] * len(lines), int(budget_tokens * CHARS_PER_TOKEN))
+    pruned = "\n".join(lines).strip()
+    return PrunedText(pruned, estimate_tokens(text), estimate_tokens(pruned))
+
+# --- RÉPONSE LLM EN FLUX ---
+# on_field(champ, valeur) : appelé pour chaque champ de premier niveau dès qu'il est complet
+FieldCallback = Callable[[str, Any], None]
+
+class JSONStreamParser:
+    """Lecture incrémentale et tolérante de l'objet JSON généré token par token : chaque champ de
+    premier niveau est rendu dès que sa valeur est fermée (chaîne, objet, liste, nombre).
+    Le texte avant la première accolade (```json, phrase d'intro) est ignoré ; un champ illisible
+    est sauté sans interrompre la lecture des suivants."""
+
+    def __init__(self):
+        self.text = ""
+        self.fields: Dict[str, Any] = {}
+        self.closed = False
+        self._pos = 0
+        self._depth = 0
+        self._in_string = self._escape = False
+        self._key: Optional[str] = None
+        self._key_start = self._value_start = None
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """Ajoute un fragment -> champs complétés par ce fragment, dans l'ordre"""
+        self.text += chunk
+        done = []
+        text, i = self.text, self._pos
+        while i < len(text) and not self.closed:
+            c = text[i]
+            if self._in_string:
+                if self._escape: self._escape = False
+                elif c == "\\": self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._value_start is None: self._read_key(text[self._key_start:i + 1])
+                    elif self._depth == 1: self._emit(i + 1, done)
+            elif c == '"':
+                self._in_string = True
+                if self._depth == 1 and self._key is None: self._key_start = i
+            elif self._depth == 0:
+                if c == "{": self._depth = 1
+            elif c in "{[":
+                self._depth += 1
+            elif c in "}]":
+                self._depth -= 1
+                if self._depth == 1: self._emit(i + 1, done)
+                elif self._depth == 0:
+                    self._emit(i, done)
+                    self.closed = True
+            elif self._depth == 1:
+                if c == ":" and self._key is not None: self._value_start = i + 1
+                elif c == ",": self._emit(i, done)
+            i += 1
+        self._pos = i
+        return done
+
+    def _read_key(self, raw: str):
+        try:
+            self._key = json.loads(raw)
+        except ValueError:
+            self._key = None
+
+    def _emit(self, end: int, done: List):
+        """Valeur du champ courant = texte[début:end], si elle est complète"""
+        if self._key is None or self._value_start is None: return
+        raw = self.text[self._value_start:end].strip()
+        key, self._key, self._value_start = self._key, None, None
+        if not raw: return
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            logger.debug(f"Champ '{key}' illisible dans la réponse en flux : {raw[:80]}")
+            return
+        self.fields[key] = value
+        done.append((key, value))
+
+def format_field(key: str, value: Any, width: int = 100) -> str:
+    """Aperçu sur une ligne d'un champ reçu (affichage au fil de la génération)"""
+    preview = json.dumps(value, ensure_ascii=False)
+    return f"{key} : {preview if len(preview) <= width else preview[:width - 1] + '…'}"
+
+class AsyncLLMClient:
+    """Client Ollama asynchrone partagé : connexions HTTP réutilisées, requêtes en vol bornées,
+    timeout par requête et reprises avec backoff exponentiel. A utiliser dans une seule boucle asyncio."""
+
+    def __init__(self, host: Optional[str] = None, max_in_flight: int = 4, timeout: float = 300.0,
+                 retries: int = 3, backoff: float = 1.0):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        limits = httpx.Limits(max_connections=max_in_flight, max_keepalive_connections=max_in_flight)
+        # Transport (pool de connexions) créé ici : on le ferme nous-mêmes, sans passer par les internes d'ollama
+        self._transport = httpx.AsyncHTTPTransport(limits=limits)
+        self._client = ollama.AsyncClient(host=host, timeout=timeout, transport=self._transport)
+        self._sem = asyncio.Semaphore(max_in_flight)
+
+    @staticmethod
+    def _retryable(e: Exception) -> bool:
+        if isinstance(e, ollama.ResponseError): return e.status_code == 429 or e.status_code >= 500
+        return isinstance(e, (httpx.TransportError, asyncio.TimeoutError))
+
+    async def generate(self, **kwargs) -> Dict:
+        async with self._sem:
+            for attempt in range(self.retries + 1):
+                try:
+                    return await asyncio.wait_for(self._client.generate(**kwargs), self.timeout)
+                except Exception as e:
+                    if attempt == self.retries or not self._retryable(e): raise
+                    delay = self.backoff * 2 ** attempt
+                    logger.warning(f"⚠️ Ollama indisponible ({type(e).__name__}), nouvel essai dans {delay:.0f}s...")
+                    await asyncio.sleep(delay)
+
+    async def stream(self, **kwargs) -> AsyncIterator[Dict]:
+        """generate(stream=True) : fragments au fil de la génération. Reprise possible tant qu'aucun
+        fragment n'est arrivé ; fermer l'itérateur coupe la connexion, donc la génération."""
+        async with self._sem:
+            for attempt in range(self.retries + 1):
+                received = False
+                try:
+                    parts = await self._client.generate(stream=True, **kwargs)
+                    # Le timeout de lecture httpx (self.timeout) borne l'attente de chaque fragment
+                    try:
+                        async for part in parts:
+                            received = True
+                            yield part
+                        return
+                    finally:
+                        await parts.aclose()
+                except Exception as e:
+                    if received or attempt == self.retries or not self._retryable(e): raise
+                    delay = self.backoff * 2 ** attempt
+                    logger.warning(f"⚠️ Ollama indisponible ({type(e).__name__}), nouvel essai dans {delay:.0f}s...")
+                    await asyncio.sleep(delay)
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+class AsyncLLMRunner:
+    """Boucle asyncio dans un thread dédié : permet de soumettre des coroutines LLM depuis du code synchrone"""
+
+    def __init__(self, max_in_flight: int = 4, **client_kwargs):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self._thread.start()
+        self.client = self.submit(self._make_client(max_in_flight, client_kwargs)).result()
+
+    @staticmethod
+    async def _make_client(max_in_flight: int, client_kwargs: Dict) -> AsyncLLMClient:
+        return AsyncLLMClient(max_in_flight=max_in_flight, **client_kwargs)
+
+    def submit(self, coro) -> "Future":
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def close(self):
+        self.submit(self.client.aclose()).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+
+    def __enter__(self): return self
+    def __exit__(self, *exc): self.close()
+
+@lru_cache(maxsize=None)
+def prompt_prefix(doc_type: str) -> str:
+    """Partie statique du prompt d'un type (consignes + schéma complet), envoyée comme `system`.
+    Construite une fois par type et identique d'un document à l'autre : Ollama garde les tokens déjà
+    évalués d'un préfixe commun, seul le texte du document est alors pré-rempli."""
+    schema = SCHEMAS.get(doc_type, SCHEMAS["generique"])
+    return (f"Analyse ce document MARKDOWN. Type détecté : {doc_type.upper()}.\n\n"
+            f"OBJECTIF : Extraire les données en JSON strict.\n\n"
+            f"RÈGLES SPÉCIFIQUES {doc_type.upper()} :\n{TYPE_RULES.get(doc_type, '')}\n\n"
+            f"SCHEMA CIBLE :\n{json.dumps(schema, ensure_ascii=False)}")
+
 class LLMOrchestrator:
-    def __init__(self, model: str):
+    def __init__(self, model: str, cache: Optional[LLMCache] = None,
+                 chunk_tokens: Optional[int] = None, concurrency: int = 2, host: Optional[str] = None,
+                 prune: bool = True, prompt_budget: int = PROMPT_BUDGET_TOKENS, rules: bool = True,
+                 stream: bool = True, keep_alive: Optional[Union[str, float]] = DEFAULT_KEEP_ALIVE,
+                 small_model: Optional[str] = None):
         self.model = model
+        # Routage : petit modèle d'abord, escalade vers `model` si son résultat ne passe pas validate_result()
+        self.small_model = small_model if small_model != model else None
+        self.cache = cache
+        # host=None : OLLAMA_HOST ou l'adresse locale par défaut
+        self.host = host
+        self._client = None
+        # Découpage map-reduce des longs documents (None = troncature à MAX_DOC_CHARS)
+        self.chunk_tokens = chunk_tokens
+        self.concurrency = concurrency
+        # Réduction du texte selon le schéma cible, puis budget de tokens du prompt unique
+        self.prune = prune
+        self.prompt_budget = prompt_budget
+        # Extraction par règles d'abord : LLM évité ou limité aux champs manquants
+        self.rule_extractor = RuleExtractor() if rules else None
+        # Réponse en flux : champs transmis dès leur fermeture, génération coupée une fois le schéma rempli
+        self.stream = stream
+        # Modèle gardé en mémoire entre les documents (et avec lui le préfixe déjà pré-rempli)
+        self.keep_alive = keep_alive
+        self._warm_up: Optional[Future] = None
+        self.stats = Counter()
+        self._stats_lock = threading.Lock()
 
-    def analyze(self, text: str, doc_type: str) -> Dict:
-        # 1. Selection du Schéma
-        schemas = {
-            "cv": {
-                "candidat": {"nom": "A déduire", "email": "", "telephone": "", "liens": []},
-                "profil_synthese": "Copier le texte d'intro",
-                "competences": {"langages": [], "outils": [], "soft_skills": []},
-                "experience": [{"poste": "", "entreprise": "", "dates": "", "missions": []}],
-                "education": [{"diplome": "", "ecole": "", "annee": ""}]
-            },
-            "facture": {
-                "document": {"type": "Facture/Devis", "numero": "", "date_emission": ""},
-                "emetteur": {"nom": "", "adresse": "", "siret": "", "iban": ""},
-                "client": {"nom": "", "adresse": ""},
-                "articles": [{"description": "", "qte": 0, "prix_unitaire": 0, "total_ligne": 0}],
-                "totaux": {"total_ht": 0.0, "total_tva": 0.0, "total_ttc": 0.0, "devise": "EUR/USD/MAD"}
-            },
-            "formulaire": {
-                "titre_formulaire": "",
-                "champs_reemplis": [{"label": "Ex: Nom", "valeur": "Ex: Dupont"}],
-                "cases_cochees": ["Liste des labels des cases cochées (ex: 'Sexe M')"],
-                "blocs_texte_libre": [],
-                "statut_signature": "Signé / Non Signé"
-            },
-            "generique": {
-                "resume": "Résumé global",
-                "entites_cles": [],
-                "dates": []
-            }
-        }
-        
-        target_schema = schemas.get(doc_type, schemas["generique"])
-        
-        # 2. Prompt Dynamique
-        prompt = f"""
-        Analyse ce document MARKDOWN. Type détecté : {doc_type.upper()}.
-        
-        OBJECTIF : Extraire les données en JSON strict.
-        
-        RÈGLES SPÉCIFIQUES {doc_type.upper()} :
-        """
-        
-        if doc_type == "cv":
-            prompt += "\n- Cherche le profil complet, les compétences techniques précises et détaille les expériences."
-        elif doc_type == "facture":
-            prompt += "\n- Cherche les montants HT/TTC, le numéro de facture et les lignes d'articles. Convertis les nombres (ex: 10,00 -> 10.00)."
-        elif doc_type == "formulaire":
-            prompt += "\n- Associe chaque question à sa réponse. Identifie les cases marquées par [x] ou X. Récupère le texte manuscrit."
-            
-        prompt += f"""
-        
-        SCHEMA CIBLE :
-        {json.dumps(target_schema, ensure_ascii=False)}
-        
-        DOCUMENT :
-        {text[:25000]}
-        """
-        
+    @property
+    def client(self) -> "ollama.Client":
+        # Créé au premier appel : instancier l'orchestrateur (GUI, --help) ne charge pas ollama/httpx
+        if self._client is None: self._client = ollama.Client(host=self.host)
+        return self._client
+
+    def _tiers(self) -> List[str]:
+        """Modèles essayés dans l'ordre"""
+        return [self.small_model, self.model] if self.small_model else [self.model]
+
+    def warm_up(self, model: Optional[str] = None) -> float:
+        """Charge le modèle dans Ollama (prompt vide : rien n'est généré) -> durée en s, ~0 s s'il était déjà chargé"""
+        start = time.perf_counter()
+        self.client.generate(model=model or self.model, keep_alive=self.keep_alive)
+        elapsed = time.perf_counter() - start
+        METRICS.observe("llm_load", elapsed)
+        with self._stats_lock:
+            self.stats["load_ms"] += int(elapsed * 1000)
+        return elapsed
+
+    def unload(self):
+        """Décharge les modèles de cet orchestrateur d'Ollama (keep_alive=0) et libère leur mémoire"""
+        for model in self._tiers():
+            try:
+                self.client.generate(model=model, keep_alive=0)
+                logger.info(f"💤 Modèle {model} déchargé")
+            except Exception as e:
+                logger.warning(f"⚠️ Déchargement du modèle {model} impossible : {e}")
+
+    def start_warm_up(self) -> Future:
+        """Préchargement en arrière-plan, pendant l'OCR. analyze() attend sa fin avant la première
+        requête : le chargement du modèle n'est pas compté dans la durée d'inférence."""
+        if self._warm_up is None:
+            self._warm_up = Future()
+            threading.Thread(target=self._run_warm_up, name="llm-warmup", daemon=True).start()
+        return self._warm_up
+
+    def _run_warm_up(self):
+        for i, model in enumerate(self._tiers()):
+            load = None
+            try:
+                load = self.warm_up(model)
+                logger.info(f"🔥 Modèle {model} prêt en {load:.1f}s (keep_alive {self.keep_alive})")
+            except Exception as e:
+                # La première requête refera le chargement (et remontera l'erreur si Ollama est absent)
+                logger.warning(f"⚠️ Préchargement du modèle {model} impossible : {e}")
+            # Le premier document n'attend que le premier modèle essayé ; le modèle principal se charge ensuite
+            if i == 0: self._warm_up.set_result(load)
+
+    def _wait_warm_up(self):
+        if self._warm_up is not None and not self._warm_up.done(): self._warm_up.result()
+
+    async def _await_warm_up(self):
+        if self._warm_up is not None and not self._warm_up.done(): await asyncio.wrap_future(self._warm_up)
+
+    def _cache_lookup(self, prompt: str, options: Dict, use_cache: bool, system: str = "",
+                      model: Optional[str] = None) -> Tuple[Optional[str], Optional[str]]:
+        """(clé, réponse en cache) pour le quadruplet (modèle, préfixe, prompt, options)"""
+        if self.cache is None or not use_cache: return None, None
+        key = self.cache.key_for(model or self.model, prompt, format="json", system=system, **options)
+        cached = self.cache.get(key)
+        if cached is not None: logger.info("♻️ Réponse LLM en cache")
+        METRICS.inc("cache_hits" if cached is not None else "cache_misses", cache="llm")
+        return key, cached
+
+    def _cache_store(self, key: Optional[str], response: str):
+        if key is None: return
+        # On ne met en cache que des réponses exploitables
         try:
-            response = ollama.generate(
-                model=self.model,
-                prompt=prompt,
-                format="json",
-                options={"temperature": 0.0, "num_ctx": 8192}
-            )
-            clean_json = re.sub(r'```json\s*', '', response['response']).strip()
-            clean_json = re.sub(r'```\s*$', '', clean_json).strip()
-            return json.loads(clean_json)
-        except Exception as e:
-            return {"error": str(e)}
+            self._parse_json(response)
+            self.cache.put(key, response)
+        except ValueError:
+            pass
+
+    def _generate(self, prompt: str, options: Dict, use_cache: bool = True, system: str = "",
+                  model: Optional[str] = None) -> str:
+        """Appel Ollama, servi depuis le cache si le quadruplet (modèle, préfixe, prompt, options) est connu"""
+        key, cached = self._cache_lookup(prompt, options, use_cache, system, model)
+        if cached is not None: return cached
+        start = time.perf_counter()
+        with METRICS.span("llm_request"):
+            result = self.client.generate(model=model or self.model, prompt=prompt, system=system, format="json", options=options,
+                                          keep_alive=self.keep_alive)
+        self._record_request(start)
+        self._record_prefill(result)
+        self._count_tokens(prompt, result)
+        self._cache_store(key, result['response'])
+        return result['response']
+
+    async def _agenerate(self, prompt: str, options: Dict, client: "AsyncLLMClient", use_cache: bool = True,
+                         system: str = "", model: Optional[str] = None) -> str:
+        # Cache SQLite lu et écrit dans un thread : les autres requêtes en vol n'attendent pas le disque
+        key, cached = await asyncio.to_thread(self._cache_lookup, prompt, options, use_cache, system, model)
+        if cached is not None: return cached
+        start = time.perf_counter()
+        with METRICS.span("llm_request"):
+            result = await client.generate(model=model or self.model, prompt=prompt, system=system, format="json", options=options,
+                                           keep_alive=self.keep_alive)
+        self._record_request(start)
+        self._record_prefill(result)
+        self._count_tokens(prompt, result)
+        await asyncio.to_thread(self._cache_store, key, result['response'])
+        return result['response']
+
+    def _generate_stream(self, prompt: str, options: Dict, use_cache: bool = True, expected: frozenset = frozenset(),
+                         on_field: Optional[FieldCallback] = None, system: str = "", model: Optional[str] = None) -> str:
+        """Appel Ollama en flux : chaque champ de premier niveau part vers on_field dès sa fermeture,
+        et la génération s'arrête quand tous les champs `expected` sont reçus"""
+        key, cached = self._cache_lookup(prompt, options, use_cache, system, model)
+        if cached is not None: return self._replay(cached, on_field)
+        parser, last, count, start = JSONStreamParser(), {}, 0, time.perf_counter()
+        with METRICS.span("llm_request"):
+            parts = self.client.generate(model=model or self.model, prompt=prompt, system=system, format="json", options=options,
+                                         keep_alive=self.keep_alive, stream=True)
+            try:
+                for last in parts:
+                    count += 1
+                    if self._on_part(parser, last, expected, on_field, start): break
+            finally:
+                # Fermer le flux coupe la connexion : Ollama arrête de générer
+                parts.close()
+        return self._end_stream(prompt, key, parser, last, count, start)
+
+    async def _agenerate_stream(self, prompt: str, options: Dict, client: "AsyncLLMClient", use_cache: bool = True,
+                                expected: frozenset = frozenset(), on_field: Optional[FieldCallback] = None,
+                                system: str = "", model: Optional[str] = None) -> str:
+        key, cached = await asyncio.to_thread(self._cache_lookup, prompt, options, use_cache, system, model)
+        if cached is not None: return self._replay(cached, on_field)
+        parser, last, count, start = JSONStreamParser(), {}, 0, time.perf_counter()
+        with METRICS.span("llm_request"):
+            parts = client.stream(model=model or self.model, prompt=prompt, system=system, format="json", options=options,
+                                  keep_alive=self.keep_alive)
+            try:
+                async for last in parts:
+                    count += 1
+                    if self._on_part(parser, last, expected, on_field, start): break
+            finally:
+                await parts.aclose()
+        return await asyncio.to_thread(self._end_stream, prompt, key, parser, last, count, start)
+
+    def _on_part(self, parser: JSONStreamParser, part: Dict, expected: frozenset,
+                 on_field: Optional[FieldCallback], start: float) -> bool:
+        """Un fragment reçu -> True si la lecture peut s'arrêter (fin, objet fermé ou champs attendus reçus)"""
+        # Premier token : chargement éventuel + pré-remplissage du prompt (hors préfixe déjà en cache)
+        if not parser.text and part.get("response"): self._record_prefill({}, time.perf_counter() - start)
+        first = not parser.fields
+        for name, value in parser.feed(part.get("response", "")):
+            if on_field: on_field(name, value)
+        if first and parser.fields:
+            elapsed = time.perf_counter() - start
+            METRICS.observe("llm_first_field", elapsed)
+            with self._stats_lock:
+                self.stats["first_fields"] += 1
+                self.stats["first_field_ms"] += int(elapsed * 1000)
+        return bool(part.get("done")) or parser.closed or bool(expected) and expected <= parser.fields.keys()
+
+    def _end_stream(self, prompt: str, key: Optional[str], parser: JSONStreamParser, last: Dict, count: int,
+                    start: float) -> str:
+        self._record_request(start)
+        if not last.get("done"):
+            # Coupé avant la fin : pas de compteurs Ollama, un fragment ≈ un token généré
+            METRICS.inc("llm_early_stops")
+            with self._stats_lock:
+                self.stats["early_stops"] += 1
+            last = {"eval_count": count}
+        with self._stats_lock:
+            self.stats["stream_tokens"] += last.get("eval_count") or count
+        self._count_tokens(prompt, last)
+        # Objet reconstitué à partir des champs lus (une réponse coupée n'a pas son accolade finale)
+        response = json.dumps(parser.fields, ensure_ascii=False) if parser.fields else parser.text
+        self._cache_store(key, response)
+        return response
+
+    def _replay(self, cached: str, on_field: Optional[FieldCallback]) -> str:
+        """Réponse complète (cache ou sans flux) : ses champs sont transmis d'un coup"""
+        if on_field:
+            for name, value in self._parse_json(cached).items(): on_field(name, value)
+        return cached
+
+    def _record_request(self, start: float):
+        """Durée d'inférence d'une requête (modèle déjà chargé si le préchargement a eu lieu)"""
+        with self._stats_lock:
+            self.stats["requests"] += 1
+            self.stats["inference_ms"] += int((time.perf_counter() - start) * 1000)
+
+    def _record_prefill(self, result: Dict, first_token_s: Optional[float] = None):
+        """Durée de pré-remplissage : délai du premier token (flux) ou prompt_eval_duration d'Ollama"""
+        if first_token_s is None:
+            if not result.get("prompt_eval_duration"): return
+            first_token_s = result["prompt_eval_duration"] / 1e9
+        METRICS.observe("llm_prefill", first_token_s)
+        with self._stats_lock:
+            self.stats["prefills"] += 1
+            self.stats["prefill_ms"] += int(first_token_s * 1000)
+
+    @staticmethod
+    def _count_tokens(prompt: str, result: Dict):
+        METRICS.inc("llm_requests")
+        METRICS.inc("llm_prompt_tokens", result.get("prompt_eval_count") or estimate_tokens(prompt))
+        METRICS.inc("llm_completion_tokens", result.get("eval_count") or 0)
+
+    @staticmethod
+    def _parse_json(raw: str) -> Dict:
+        clean_json = re.sub(r'```json\s*', '', raw).strip()
+        clean_json = re.sub(r'```\s*$', '', clean_json).strip()
+        return json.loads(clean_json)
+
+    def _reduce_text(self, text: str, doc_type: str) -> str:
+        # En map-reduce, la longueur est gérée par le découpage : pas de budget
+        pruned = prune_for_schema(text, doc_type, None if self.chunk_tokens else self.prompt_budget)
+        saved = pruned.tokens_before - pruned.tokens_after
+        with self._stats_lock:
+            self.stats["tokens_before"] += pruned.tokens_before
+            self.stats["tokens_after"] += pruned.tokens_after
+        METRICS.inc("llm_pruned_tokens", saved)
+        if saved > 0:
+            logger.info(f"✂️ Texte réduit pour le LLM : {pruned.tokens_before} → {pruned.tokens_after} tokens "
+                        f"(-{saved / pruned.tokens_before:.0%})")
+        return pruned.text
+
+    def _prompts(self, text: str, doc_type: str, schema: Optional[Dict] = None) -> List[str]:
+        """Un seul prompt, ou un par morceau en mode map-reduce ; `schema` : champs restant à extraire.
+        Seule la partie propre au document est construite ici : le reste est dans prompt_prefix()"""
+        if self.prune:
+            with METRICS.span("prune"):
+                text = self._reduce_text(text, doc_type)
+        if self.chunk_tokens and estimate_tokens(text) > self.chunk_tokens:
+            chunks = split_markdown(text, self.chunk_tokens)
+            logger.info(f"🧩 Analyse découpée : {len(chunks)} morceaux, {self.concurrency} en parallèle")
+            return [
+                self._build_prompt(chunk, f"Ce texte est l'extrait {i+1}/{len(chunks)} d'un document plus long : ne remplis que les champs présents dans cet extrait, laisse les autres vides.", schema)
+                for i, chunk in enumerate(chunks)
+            ]
+        # Texte réduit : déjà sous --prompt-budget
+        if self.prune: return [self._build_prompt(text, schema=schema)]
+        if len(text) > MAX_DOC_CHARS:
+            logger.warning(f"⚠️ Document tronqué à {MAX_DOC_CHARS} caractères (voir --chunk-tokens)")
+        return [self._build_prompt(text[:MAX_DOC_CHARS], schema=schema)]
+
+    @staticmethod
+    def _reduce(partials: List[Dict]) -> Dict:
+        """Fusion déterministe (ordre des morceaux) des JSON partiels"""
+        valid = [p for p in partials if "error" not in p]
+        if not valid: return partials[0]
+        merged = {}
+        for partial in valid:
+            merged = merge_json(merged, partial)
+        return merged
+
+    def _apply_rules(self, text: str, doc_type: str) -> Optional[RuleResult]:
+        """Règles déterministes avant le LLM : None si elles ne s'appliquent pas au type"""
+        if self.rule_extractor is None: return None
+        result = self.rule_extractor.extract(text, doc_type)
+        if result is None: return None
+        outcome = "partial" if result.missing else "complete"
+        with self._stats_lock:
+            self.stats[f"rules_{outcome}"] += 1
+        METRICS.inc("rules", outcome=outcome)
+        if result.missing:
+            logger.info(f"📏 Règles : {result.coverage:.0%} du schéma couvert, LLM limité à {', '.join(result.missing)}")
+        else:
+            logger.info("⚡ Schéma entièrement couvert par les règles : LLM évité")
+        return result
+
+    @staticmethod
+    def _with_rules(rules: Optional[RuleResult], data: Dict, doc_type: str) -> Dict:
+        """Valeurs des règles, complétées par les seuls champs demandés au LLM, dans l'ordre du schéma"""
+        if rules is None: return data
+        asked = _schema_restrict(rules.missing, data)
+        if "error" in data: asked["error"] = data["error"]
+        return _schema_order(SCHEMAS[doc_type], merge_json(rules.data, asked))
+
+    @staticmethod
+    def _field_sink(rules: Optional[RuleResult], on_field: Optional[FieldCallback]) -> Optional[FieldCallback]:
+        """Transmet d'abord les champs trouvés par les règles, puis ceux du LLM complétés par les règles"""
+        if on_field is None: return None
+        found = rules.data if rules else {}
+        for name, value in found.items():
+            if not _is_empty(value): on_field(name, value)
+        return lambda name, value: on_field(name, merge_json(found[name], value) if name in found else value)
+
+    def _expected(self, rules: Optional[RuleResult], doc_type: str) -> frozenset:
+        """Champs de premier niveau dont la fermeture met fin à la génération"""
+        return frozenset(rules.missing if rules else SCHEMAS.get(doc_type, SCHEMAS["generique"]))
+
+    def _accept(self, model: str, data: Dict, text: str, doc_type: str) -> bool:
+        """Résultat du petit modèle gardé s'il passe validate_result(), sinon escalade vers le modèle principal"""
+        if model == self.model: return True
+        issues = validate_result(merge_data(json.loads(json.dumps(data)), text, doc_type), text, doc_type)
+        outcome = "escalated" if issues else "small"
+        with self._stats_lock:
+            self.stats[f"routing_{outcome}"] += 1
+        METRICS.inc("llm_routing", outcome=outcome)
+        if issues: logger.info(f"⤴️ Escalade {model} → {self.model} : {'; '.join(issues)}")
+        return not issues
+
+    def analyze(self, text: str, doc_type: str, use_cache: bool = True, on_field: Optional[FieldCallback] = None) -> Dict:
+        """on_field : champs transmis au fil de la génération (prompt unique ; sans flux, tous à la fin).
+        En cas d'escalade, les champs du modèle principal remplacent ceux du petit modèle."""
+        rules = self._apply_rules(text, doc_type)
+        on_field = self._field_sink(rules, on_field)
+        if rules is not None and not rules.missing: return self._with_rules(rules, {}, doc_type)
+        expected, system = self._expected(rules, doc_type), prompt_prefix(doc_type)
+        self._wait_warm_up()
+
+        def run(prompt: str, model: str, on_field: Optional[FieldCallback] = None) -> Dict:
+            try:
+                if self.stream:
+                    return self._parse_json(self._generate_stream(prompt, LLM_OPTIONS, use_cache, expected, on_field, system, model))
+                return self._parse_json(self._replay(self._generate(prompt, LLM_OPTIONS, use_cache, system, model), on_field))
+            except Exception as e:
+                METRICS.inc("llm_errors")
+                return {"error": str(e)}
+
+        with METRICS.span("llm"):
+            prompts = self._prompts(text, doc_type, rules.missing if rules else None)
+            for model in self._tiers():
+                if len(prompts) == 1:
+                    data = self._with_rules(rules, run(prompts[0], model, on_field), doc_type)
+                else:
+                    # Map-reduce : les champs d'un morceau sont partiels, seul le résultat fusionné compte
+                    with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+                        data = self._with_rules(rules, self._reduce(list(pool.map(lambda p: run(p, model), prompts))), doc_type)
+                if self._accept(model, data, text, doc_type): return data
+        return data
+
+    async def analyze_async(self, text: str, doc_type: str, client: "AsyncLLMClient", use_cache: bool = True,
+                            on_field: Optional[FieldCallback] = None) -> Dict:
+        """Variante asyncio : les morceaux partent tous, le client borne les requêtes en vol.
+        Règles et réduction du texte (CPU) tournent dans un thread pour ne pas bloquer la boucle"""
+        rules = await asyncio.to_thread(self._apply_rules, text, doc_type)
+        on_field = self._field_sink(rules, on_field)
+        if rules is not None and not rules.missing: return self._with_rules(rules, {}, doc_type)
+        expected, system = self._expected(rules, doc_type), prompt_prefix(doc_type)
+        await self._await_warm_up()
+
+        async def run(prompt: str, model: str, on_field: Optional[FieldCallback] = None) -> Dict:
+            try:
+                if self.stream:
+                    return self._parse_json(await self._agenerate_stream(prompt, LLM_OPTIONS, client, use_cache, expected,
+                                                                         on_field, system, model))
+                return self._parse_json(self._replay(await self._agenerate(prompt, LLM_OPTIONS, client, use_cache, system, model),
+                                                     on_field))
+            except Exception as e:
+                METRICS.inc("llm_errors")
+                return {"error": str(e)}
+
+        with METRICS.span("llm"):
+            prompts = await asyncio.to_thread(self._prompts, text, doc_type, rules.missing if rules else None)
+            for model in self._tiers():
+                if len(prompts) == 1:
+                    data = self._with_rules(rules, await run(prompts[0], model, on_field), doc_type)
+                else:
+                    partials = await asyncio.gather(*(run(p, model) for p in prompts))
+                    data = self._with_rules(rules, self._reduce(list(partials)), doc_type)
+                if self._accept(model, data, text, doc_type): return data
+        return data
+
+    @staticmethod
+    def _build_prompt(text: str, part: str = "", schema: Optional[Dict] = None) -> str:
+        """Partie variable du prompt : consigne du morceau, champs restant à extraire, texte"""
+        prompt = f"{part}\n\n" if part else ""
+        if schema:
+            prompt += ("Les autres champs sont déjà extraits : ne remplis que ceux-ci.\n"
+                       f"CHAMPS À REMPLIR :\n{json.dumps(schema, ensure_ascii=False)}\n\n")
+        return prompt + f"DOCUMENT :\n{text}"
 
 def merge_data(llm_data: Dict, raw_text: str, doc_type: str) -> Dict:
     # Boost Regex appliqué à tous les types (utile pour email/tel facture aussi)
@@ -282,51 +1719,367 @@ def merge_data(llm_data: Dict, raw_text: str, doc_type: str) -> Dict:
     
     elif doc_type == "facture" and "emetteur" in llm_data:
         # Parfois l'IBAN est manqué par le LLM
-        iban_match = re.search(r'[A-Z]{2}\d{2}[a-zA-Z0-9]{1,30}', raw_text.replace(" ", ""))
-        if iban_match and not llm_data["emetteur"].get("iban"):
-            llm_data["emetteur"]["iban"] = iban_match.group(0)
+        if reg["iban"] and not llm_data["emetteur"].get("iban"):
+            llm_data["emetteur"]["iban"] = reg["iban"]
 
     return llm_data
 
+def collect_inputs(spec: str) -> List[Path]:
+    """Fichier, dossier ou motif glob -> liste triée des documents supportés"""
+    path = Path(spec)
+    if path.is_file(): return [path]
+    if path.is_dir(): candidates = path.iterdir()
+    else: candidates = (Path(p) for p in glob.glob(spec, recursive=True))
+    return sorted(p for p in candidates if p.is_file() and p.suffix.lower() in SUPPORTED_EXTS)
+
+def count_pages(file_path: Path) -> int:
+    if file_path.suffix.lower() != '.pdf': return 1
+    with fitz.open(str(file_path)) as doc:
+        return doc.page_count
+
+def result_names(files: List[Path]) -> Dict[Path, str]:
+    """Nom du JSON de chaque entrée : <nom>_data.json, ou <nom>_<ext>_<empreinte du chemin>_data.json
+    quand plusieurs entrées ont le même nom (a.pdf et a.png, sous-dossiers d'un glob récursif)"""
+    stems = Counter(f.stem.lower() for f in files)
+    names = {}
+    for f in files:
+        if stems[f.stem.lower()] == 1: names[f] = f"{f.stem}_data.json"
+        else:
+            digest = hashlib.sha1(str(f.resolve()).encode("utf-8")).hexdigest()[:8]
+            names[f] = f"{f.stem}_{f.suffix.lstrip('.').lower()}_{digest}_data.json"
+    return names
+
+def result_path(args, file_path: Path, names: Optional[Dict[Path, str]] = None) -> Path:
+    return args.output / (names or {}).get(file_path, f"{file_path.stem}_data.json")
+
+def write_result(out_file: Path, final_data: Dict, timings: Dict, args):
+    if args.timings: final_data["_timings"] = timings
+    with open(out_file, 'w', encoding='utf-8') as f:
+        json.dump(final_data, f, indent=2, ensure_ascii=False)
+
+async def analyze_document(raw_md: str, doc_type: str, llm: LLMOrchestrator, client: AsyncLLMClient,
+                           on_field: Optional[FieldCallback] = None) -> Tuple[str, Dict]:
+    """Détection (si 'auto') + LLM + fusion pour un texte déjà extrait -> (type, données)"""
+    detected_type = await asyncio.to_thread(DocumentClassifier().detect, raw_md) if doc_type == 'auto' else doc_type
+    data = await llm.analyze_async(raw_md, detected_type, client, on_field=on_field)
+    return detected_type, merge_data(data, raw_md, detected_type)
+
+class DocJob(NamedTuple):
+    """Un document entre deux étapes du mode lot"""
+    file_path: Path
+    plan: Plan
+    raw_md: str
+    timings: Dict[str, Any]
+    doc_type: Optional[str] = None
+
+def make_cache(args) -> Optional[ExtractionCache]:
+    if args.no_cache: return None
+    return ExtractionCache(args.cache_dir, max_bytes=args.cache_size * 1024 * 1024)
+
+def make_store(args, batch_size: int = 100) -> Optional[ResultStore]:
+    return ResultStore(args.store, batch_size=batch_size) if args.store else None
+
+def make_llm(args) -> "LLMOrchestrator":
+    cache = None if args.no_llm_cache else LLMCache(args.cache_dir, ttl=args.llm_cache_ttl * 3600)
+    return LLMOrchestrator(model=args.model, cache=cache, chunk_tokens=args.chunk_tokens or None,
+                           concurrency=args.llm_parallel, prune=args.prune, prompt_budget=args.prompt_budget,
+                           rules=args.rules, stream=args.stream, keep_alive=args.keep_alive,
+                           small_model=args.small_model)
+
+def run_batch(files: List[Path], args):
+    """Mode lot : pipeline par étapes reliées par des files bornées.
+    extraction (--workers threads, pages OCR sur un pool de processus) -> classification (1 thread)
+    -> LLM (--llm-parallel documents en vol) -> écriture (1 thread : JSON, base, manifeste).
+    Le document N+1 est extrait pendant que le document N est au LLM ; une file pleine bloque
+    l'étape en amont, au lieu d'accumuler en mémoire les textes que le LLM n'absorbe pas.
+    Le manifeste du dossier de sortie permet de reprendre un lot interrompu : fichiers déjà
+    traités ignorés, texte extrait repris tel quel, seuls les nouveaux fichiers ou modifiés refaits."""
+    depth = args.pipeline_depth or 2 * args.workers
+    # Un JSON par entrée, même si deux entrées portent le même nom
+    names = result_names(files)
+    console.print(f"📚 Mode lot : {len(files)} documents, {args.workers} workers, files de {depth} documents entre étapes")
+    start = time.time()
+    counts, failed = Counter(), []
+    counts_lock = threading.Lock()
+    manifest = BatchManifest(args.output / MANIFEST_NAME)
+    # Un document par transaction : le manifeste ne le marque traité qu'une fois en base (reprise fiable)
+    store = make_store(args, batch_size=1)
+    # Ce qui détermine le JSON à partir du texte extrait
+    analyze_params = dict(model=args.model, type=args.type, chunk_tokens=args.chunk_tokens, timings=args.timings,
+                          prune=args.prune, prompt_budget=args.prompt_budget, rules=args.rules, stream=args.stream)
+    # Ajouté seulement s'il sert : les manifestes existants restent valides sans routage
+    if args.small_model: analyze_params["small_model"] = args.small_model
+
+    inputs = StageQueue("entrée")
+    for f in files: inputs.put(f)
+    inputs.put(STOP)
+    to_classify, to_llm = StageQueue("classification", depth), StageQueue("llm", depth)
+    # Une place par document en vol : rendue par l'écriture, la file de sortie ne déborde jamais
+    to_write = StageQueue("écriture", args.llm_parallel)
+    llm_slots = threading.Semaphore(args.llm_parallel)
+
+    def count(key: str, n: int = 1):
+        with counts_lock:
+            counts[key] += n
+
+    def fail(file_path: Path, plan: Optional[Plan], step: str, e: Exception):
+        logger.error(f"❌ {file_path.name} : {e}")
+        if plan: manifest.mark_failed(file_path, plan.sha256, f"{step}: {e}")
+        METRICS.inc("documents", status="error")
+        failed.append(file_path)
+
+    # Base et manifeste fermés en dernier, y compris sur interruption
+    with closing(manifest), closing(store) if store else nullcontext(), \
+         ProcessPoolExecutor(max_workers=args.workers) as pool, \
+         AsyncLLMRunner(max_in_flight=args.llm_parallel) as runner:
+        ext = SmartExtractor(executor=pool, cache=make_cache(args), engine=make_ocr_engine(args.ocr_engine),
+                             dpi=args.dpi, layout=args.layout)
+        llm = make_llm(args)
+        # Le modèle se charge pendant l'OCR des premiers documents
+        llm.start_warm_up()
+
+        def extract(file_path: Path):
+            # Empreinte + comparaison au manifeste dans le thread : pas de lecture séquentielle de tout le lot
+            try:
+                plan = manifest.plan(file_path, ext.params, analyze_params)
+            except Exception as e:
+                return fail(file_path, None, "plan", e)
+            if args.no_resume and plan.action != "extract": plan = Plan("extract", plan.sha256)
+            if plan.action == "skip":
+                count("skipped")
+                METRICS.inc("documents", status="skipped")
+                return console.print(f"⏭️ {file_path.name} : déjà traité")
+            with METRICS.trace() as timings:
+                if plan.action == "analyze":
+                    count("resumed")
+                    logger.info(f"⏩ {file_path.name} : reprise après l'extraction")
+                    return to_classify.put(DocJob(file_path, plan, plan.raw_text, timings))
+                try:
+                    raw_md = ext.extract(file_path)
+                except Exception as e:
+                    return fail(file_path, plan, "extract", e)
+            manifest.mark_extracted(file_path, plan.sha256, ext.params, raw_md)
+            to_classify.put(DocJob(file_path, plan, raw_md, timings))
+
+        def classify(job: DocJob):
+            try:
+                doc_type = args.type
+                if doc_type == "auto":
+                    with METRICS.trace(job.timings):
+                        doc_type = DocumentClassifier().detect(job.raw_md)
+                to_llm.put(job._replace(doc_type=doc_type))
+            except Exception as e:
+                fail(job.file_path, job.plan, "classify", e)
+
+        async def analyze(job: DocJob) -> Tuple[str, Dict]:
+            with METRICS.trace(job.timings):
+                return await analyze_document(job.raw_md, job.doc_type, llm, runner.client)
+
+        def dispatch(job: DocJob):
+            # Attend une place libre : au-delà, les documents restent dans la file bornée en amont
+            llm_slots.acquire()
+            coro = analyze(job)
+            try:
+                fut = runner.submit(coro)
+            except Exception as e:
+                # Place rendue ici : l'écriture ne verra jamais ce document, drain() ne doit pas l'attendre
+                coro.close()
+                llm_slots.release()
+                return fail(job.file_path, job.plan, "analyze", e)
+            fut.add_done_callback(lambda fut: to_write.put((job, fut)))
+
+        def drain():
+            # Toutes les places rendues = tous les documents envoyés au LLM sont écrits
+            for _ in range(args.llm_parallel): llm_slots.acquire()
+            to_write.put(STOP)
+
+        def write(item: Tuple[DocJob, Future]):
+            job, fut = item
+            try:
+                doc_type, final_data = fut.result()
+                out_file = result_path(args, job.file_path, names)
+                write_result(out_file, final_data, job.timings, args)
+                if store: store.add(job.file_path.resolve(), doc_type, final_data, job.plan.sha256)
+                manifest.mark_done(job.file_path, job.plan.sha256, ext.params, analyze_params, out_file)
+                count("pages", count_pages(job.file_path))
+                count("done")
+                METRICS.inc("documents", status="ok")
+                console.print(f"✅ {job.file_path.name}")
+            except Exception as e:
+                fail(job.file_path, job.plan, "analyze", e)
+            finally:
+                llm_slots.release()
+
+        stages = [
+            Stage("extraction", extract, inputs, threads=args.workers, on_done=lambda: to_classify.put(STOP)),
+            Stage("classification", classify, to_classify, on_done=lambda: to_llm.put(STOP)),
+            Stage("llm", dispatch, to_llm, on_done=drain),
+            Stage("écriture", write, to_write),
+        ]
+        for stage in stages: stage.join()
+    done, pages, skipped, resumed = counts["done"], counts["pages"], counts["skipped"], counts["resumed"]
+
+    elapsed = max(time.time() - start, 1e-9)
+    summary = (
+        f"Documents : {done}/{len(files) - skipped}  |  Pages : {pages}  |  Durée : {elapsed:.2f}s\n"
+        f"Débit : {pages / elapsed:.2f} pages/s  |  {done / elapsed:.2f} docs/s"
+    )
+    if skipped or resumed:
+        summary += f"\nReprise : {skipped} fichiers déjà traités ignorés, {resumed} repris après l'extraction"
+    if ext.cache:
+        st = ext.cache.stats()
+        summary += f"\nCache extraction : {st['hits']} hits / {st['misses']} misses ({st['hit_rate']:.0%})"
+    if llm.cache:
+        st = llm.cache.stats()
+        summary += f"\nCache LLM : {st['hits']} hits / {st['misses']} misses ({st['hit_rate']:.0%})"
+    if llm.stats["rules_complete"] or llm.stats["rules_partial"]:
+        summary += (f"\nRègles : {llm.stats['rules_complete']} documents sans appel LLM, "
+                    f"{llm.stats['rules_partial']} avec un schéma limité aux champs manquants")
+    if llm.stats["first_fields"]:
+        st = llm.stats
+        summary += (f"\nFlux LLM : 1er champ après {st['first_field_ms'] / st['first_fields'] / 1000:.2f}s en moyenne, "
+                    f"{st['stream_tokens']} tokens générés, {st['early_stops']} générations arrêtées une fois le schéma rempli")
+    if llm.stats["routing_small"] or llm.stats["routing_escalated"]:
+        st, routed = llm.stats, llm.stats["routing_small"] + llm.stats["routing_escalated"]
+        summary += (f"\nRoutage LLM : {st['routing_small']}/{routed} documents terminés sur {llm.small_model} "
+                    f"({st['routing_escalated'] / routed:.0%} escaladés vers {llm.model})")
+    if llm.stats["requests"]:
+        st = llm.stats
+        summary += (f"\nModèle LLM : chargement {st['load_ms'] / 1000:.2f}s (préchargé pendant l'OCR), "
+                    f"inférence {st['inference_ms'] / 1000:.2f}s cumulés sur {st['requests']} requêtes")
+    if llm.stats["prefills"]:
+        st = llm.stats
+        summary += (f"\nPré-remplissage LLM : {st['prefill_ms'] / st['prefills'] / 1000:.2f}s en moyenne par requête "
+                    f"(préfixe statique par type réutilisé par Ollama)")
+    if llm.stats["tokens_before"]:
+        st = llm.stats
+        summary += (f"\nTexte envoyé au LLM : {st['tokens_after']}/{st['tokens_before']} tokens "
+                    f"({1 - st['tokens_after'] / st['tokens_before']:.0%} retirés par la réduction selon le schéma)")
+    if ext.stats["ocr_pages"]:
+        st = ext.stats
+        spared = (st["skipped_pixels"] + st["cropped_pixels"]) / max(st["pixels"], 1)
+        summary += (f"\nPré-passe OCR : {st['blank_pages']}/{st['ocr_pages']} pages blanches ignorées, "
+                    f"{spared:.0%} des pixels épargnés à Tesseract")
+    for q in (to_classify, to_llm, to_write):
+        if q.items: summary += f"\nFile {q.summary()}"
+    if METRICS.enabled:
+        summary += "\nÉtapes (cumul) : " + "  |  ".join(f"{stage} {total:.2f}s" for stage, (_, total) in METRICS.stage_totals().items())
+    if failed: summary += f"\nÉchecs : {', '.join(f.name for f in failed)}"
+    from rich.panel import Panel
+    console.print(Panel(summary, title="Résumé du lot", border_style="red" if failed else "green"))
+    if args.metrics_file: METRICS.write_textfile(args.metrics_file)
+
+def _dpi_arg(value: str):
+    if value == ADAPTIVE_DPI: return value
+    try:
+        return int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"entier ou '{ADAPTIVE_DPI}' attendu : {value}")
+
+def _keep_alive_arg(value: str):
+    # Ollama accepte un nombre de secondes ou une durée Go ("30m") ; "-1" seul n'est pas une durée valide
+    return int(value) if value.lstrip("-").isdigit() else value
+
+def add_pipeline_args(parser: argparse.ArgumentParser):
+    """Options communes à la CLI et au service (modèle, workers, moteur OCR, caches)"""
+    parser.add_argument("--model", default="llama3.2", help="Modèle Ollama")
+    parser.add_argument("--small-model", help="Petit modèle essayé d'abord (ex: llama3.2:1b) ; --model seulement si "
+                                              "le résultat échoue aux contrôles (champs requis, HT + TVA = TTC, contacts)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Processus OCR en parallèle")
+    parser.add_argument("--dpi", type=_dpi_arg, default=OCR_DPI,
+                        help=f"DPI de rendu des pages scannées, ou '{ADAPTIVE_DPI}' : choisi par page selon la taille du texte")
+    parser.add_argument("--no-layout", dest="layout", action="store_false",
+                        help="OCR de la page entière (sans détection des pages blanches ni découpe de la zone de texte)")
+    parser.add_argument("--ocr-engine", choices=list(OCR_ENGINES), default="pytesseract",
+                        help="Moteur OCR (tesserocr : libtesseract en processus, modèles gardés en mémoire)")
+    parser.add_argument("--cache-dir", type=Path, default=DEFAULT_CACHE_DIR, help="Dossier des caches persistants")
+    parser.add_argument("--cache-size", type=int, default=512, help="Taille max du cache d'extraction (Mo)")
+    parser.add_argument("--no-cache", action="store_true", help="Désactive le cache d'extraction")
+    parser.add_argument("--no-llm-cache", action="store_true", help="Force un nouvel appel au LLM (ignore le cache)")
+    parser.add_argument("--chunk-tokens", type=int, default=0, help="Découpe les longs documents en morceaux de N tokens (0 = tronquer)")
+    parser.add_argument("--no-prune", dest="prune", action="store_false",
+                        help="Envoie tout le texte au LLM (sans réduction selon le schéma du type de document)")
+    parser.add_argument("--prompt-budget", type=int, default=PROMPT_BUDGET_TOKENS,
+                        help="Tokens max du texte envoyé en un seul prompt, après réduction (hors --chunk-tokens)")
+    parser.add_argument("--no-rules", dest="rules", action="store_false",
+                        help="Tout demander au LLM (sans extraction préalable par règles : regex, tableaux, totaux)")
+    parser.add_argument("--no-stream", dest="stream", action="store_false",
+                        help="Attend la réponse LLM complète (sans flux : ni champs au fil de l'eau, ni arrêt anticipé)")
+    parser.add_argument("--keep-alive", type=_keep_alive_arg, default=DEFAULT_KEEP_ALIVE,
+                        help="Durée pendant laquelle Ollama garde le modèle chargé (ex: 30m, 2h ; -1 = toujours, 0 = décharger)")
+    parser.add_argument("--llm-parallel", type=int, default=2, help="Requêtes LLM simultanées (morceaux et documents du lot)")
+    parser.add_argument("--llm-cache-ttl", type=float, default=168, help="Durée de vie du cache LLM (heures)")
+    parser.add_argument("--store", type=Path, nargs="?", const=DEFAULT_STORE,
+                        help=f"Enregistre aussi les résultats dans une base SQLite indexée (défaut : {DEFAULT_STORE}, voir ocr_store.py)")
+
 def main():
     parser = argparse.ArgumentParser(description="OCR Extractor")
-    parser.add_argument("input", type=Path, help="Fichier d'entrée")
+    parser.add_argument("input", help="Fichier d'entrée, dossier ou motif glob (ex: 'scans/*.pdf')")
     # Modification ici : 'auto' est le defaut, mais on peut forcer
     parser.add_argument("--type", choices=['auto', 'cv', 'facture', 'formulaire'], default='auto')
-    parser.add_argument("--model", default="llama3.2", help="Modèle Ollama")
     parser.add_argument("--output", type=Path, default=Path("output"))
+    add_pipeline_args(parser)
+    parser.add_argument("--no-resume", action="store_true",
+                        help=f"Mode lot : retraite tous les fichiers sans consulter le manifeste ({MANIFEST_NAME})")
+    parser.add_argument("--pipeline-depth", type=int, default=0,
+                        help="Mode lot : documents en attente max entre deux étapes (0 = 2 × --workers)")
+    parser.add_argument("--timings", action="store_true", help="Ajoute un bloc _timings (durées par étape/page) au JSON")
+    parser.add_argument("--metrics-file", type=Path, help="Exporte les métriques au format texte Prometheus (node_exporter textfile)")
     args = parser.parse_args()
+    METRICS.enabled = bool(args.timings or args.metrics_file)
     
-    if not args.input.exists(): return console.print("[red]Fichier introuvable[/red]")
+    files = collect_inputs(args.input)
+    if not files: return console.print("[red]Fichier introuvable[/red]")
     args.output.mkdir(exist_ok=True, parents=True)
+    if not Path(args.input).is_file(): return run_batch(files, args)
+    input_path = files[0]
+
+    # Chargement du modèle en arrière-plan, pendant l'extraction
+    llm = make_llm(args)
+    llm.start_warm_up()
 
     # 1. Extraction
-    ext = SmartExtractor()
+    pool = ProcessPoolExecutor(max_workers=args.workers) if args.workers > 1 else None
+    ext = SmartExtractor(executor=pool, cache=make_cache(args), engine=make_ocr_engine(args.ocr_engine),
+                         dpi=args.dpi, layout=args.layout)
     start = time.time()
-    raw_md = ext.extract(args.input)
-    
-    # 2. Détection du type
-    detected_type = args.type
-    if args.type == 'auto':
-        classifier = DocumentClassifier()
-        detected_type = classifier.detect(raw_md)
-        console.print(f"🤖 Type détecté : [bold cyan]{detected_type.upper()}[/bold cyan]")
-    else:
-        console.print(f"⚙️ Type forcé : [bold magenta]{detected_type.upper()}[/bold magenta]")
+    with METRICS.trace() as timings:
+        try:
+            raw_md = ext.extract(input_path)
+        finally:
+            if pool: pool.shutdown()
+        
+        # 2. Détection du type
+        detected_type = args.type
+        if args.type == 'auto':
+            classifier = DocumentClassifier()
+            detected_type = classifier.detect(raw_md)
+            console.print(f"🤖 Type détecté : [bold cyan]{detected_type.upper()}[/bold cyan]")
+        else:
+            console.print(f"⚙️ Type forcé : [bold magenta]{detected_type.upper()}[/bold magenta]")
 
-    # 3. Analyse LLM
-    llm = LLMOrchestrator(model=args.model)
-    with console.status(f"Parsing en tant que {detected_type}...", spinner="bouncingBar"):
-        data = llm.analyze(raw_md, detected_type)
+        # 3. Analyse LLM
+        with console.status(f"Parsing en tant que {detected_type}...", spinner="bouncingBar"):
+            data = llm.analyze(raw_md, detected_type,
+                               on_field=lambda key, value: console.print(f"  ▸ {format_field(key, value)}", markup=False))
     
     # 4. Correction & Sauvegarde
     final_data = merge_data(data, raw_md, detected_type)
-    out_file = args.output / f"{args.input.stem}_data.json"
-    with open(out_file, 'w', encoding='utf-8') as f:
-        json.dump(final_data, f, indent=2, ensure_ascii=False)
+    write_result(result_path(args, input_path), final_data, timings, args)
+    store = make_store(args)
+    if store:
+        store.add(input_path.resolve(), detected_type, final_data)
+        store.close()
+    METRICS.inc("documents", status="ok")
+    if args.metrics_file: METRICS.write_textfile(args.metrics_file)
         
+    from rich.json import JSON
+    from rich.panel import Panel
     console.print(Panel(JSON(json.dumps(final_data, ensure_ascii=False)), title=f"Résultat ({detected_type})", border_style="green"))
-    console.print(f"✅ Terminé en {time.time()-start:.2f}s")
+    llm_times = ""
+    if llm.stats["requests"]:
+        llm_times = f" (LLM : chargement {llm.stats['load_ms'] / 1000:.2f}s, inférence {llm.stats['inference_ms'] / 1000:.2f}s)"
+    console.print(f"✅ Terminé en {time.time()-start:.2f}s{llm_times}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
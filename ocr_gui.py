@@ -20,8 +20,11 @@ from ocr_extractor import (
     DocumentClassifier, 
     LLMOrchestrator,
     RegexBooster,
+    SCHEMAS,
+    format_field,
     merge_data
 )
+from ocr_cache import ExtractionCache, LLMCache
 
 # Configuration CustomTkinter
 ctk.set_appearance_mode("dark")
@@ -67,12 +70,17 @@ class OCRApp(ctk.CTk, TkinterDnD.DnDWrapper):
         self.selected_file = None
         self.processing = False
         self.result_data = None
+        self.extraction_cache = ExtractionCache()
+        self.llm_cache = LLMCache()
+        # Orchestrateur du modèle sélectionné, préchargé dès le choix du modèle
+        self.llm = None
         
         # Configuration Drag & Drop
         self.TkdndVersion = TkinterDnD._require(self)
         
         # Création de l'interface
         self._create_widgets()
+        self._warm_model()
         
     def _create_widgets(self):
         """Création de tous les widgets de l'interface"""
@@ -146,6 +154,7 @@ class OCRApp(ctk.CTk, TkinterDnD.DnDWrapper):
             self.left_frame,
             values=models,
             variable=self.model_var,
+            command=lambda _: self._warm_model(),
             width=200
         )
         self.model_menu.pack(pady=5, padx=20)
@@ -303,6 +312,21 @@ class OCRApp(ctk.CTk, TkinterDnD.DnDWrapper):
         if folder:
             self.output_var.set(folder)
             
+    def _warm_model(self):
+        """Charge le modèle sélectionné dans Ollama en arrière-plan : le premier document
+        n'attend pas ce chargement (ou seulement ce qu'il en reste après l'OCR)"""
+        previous = self.llm
+        if previous is not None and previous.model == self.model_var.get(): return
+        self.llm = LLMOrchestrator(model=self.model_var.get(), cache=self.llm_cache)
+        self.llm.start_warm_up()
+        # Parcourir le menu ne doit pas laisser plusieurs gros modèles chargés dans Ollama
+        if previous is not None: threading.Thread(target=self._unload_model, args=(previous,), daemon=True).start()
+
+    def _unload_model(self, llm: LLMOrchestrator):
+        """Décharge le modèle quitté une fois son préchargement terminé, sauf s'il a été resélectionné entre-temps"""
+        llm.start_warm_up().result()
+        if llm.model != self.llm.model: llm.unload()
+
     def _process_document(self):
         """Traiter le document dans un thread séparé"""
         if self.processing:
@@ -368,7 +392,7 @@ class OCRApp(ctk.CTk, TkinterDnD.DnDWrapper):
             
             # 1. Extraction
             self._update_status("Extraction du texte...")
-            extractor = SmartExtractor()
+            extractor = SmartExtractor(cache=self.extraction_cache)
             # On passe notre fonction de callback
             raw_text = extractor.extract(self.selected_file, progress_callback=self.update_progress)
             
@@ -384,8 +408,20 @@ class OCRApp(ctk.CTk, TkinterDnD.DnDWrapper):
             
             # 3. Analyse LLM
             self._update_status(f"Analyse LLM ({doc_type})...")
-            llm = LLMOrchestrator(model=self.model_var.get())
-            data = llm.analyze(raw_text, doc_type)
+            if self.llm is None or self.llm.model != self.model_var.get(): self._warm_model()
+            llm = self.llm
+            # Champs affichés au fil de la génération, la barre avance de 80 à 95 %
+            received = []
+            expected = len(SCHEMAS.get(doc_type, SCHEMAS["generique"]))
+
+            def on_field(key, value):
+                print(f"  ▸ {format_field(key, value)}")
+                received.append(key)
+                self.update_progress(0.8 + 0.15 * min(len(received) / expected, 1), f"Analyse LLM ({doc_type}) : {key} ✓")
+
+            data = llm.analyze(raw_text, doc_type, on_field=on_field)
+            if llm.stats["requests"]:
+                print(f"⏱️ LLM : chargement {llm.stats['load_ms'] / 1000:.2f}s, inférence {llm.stats['inference_ms'] / 1000:.2f}s (cumul)")
             
             # 4. Enrichissement
             self._update_status("Enrichissement des données...")
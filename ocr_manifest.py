@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Manifeste de lot (SQLite) pour Ultimate OCR & LLM Parser : reprise après interruption
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Dict, Any, NamedTuple
+
+from ocr_cache import DiskCache, file_sha256
+
+MANIFEST_NAME = ".manifest.sqlite"
+
+# Étapes, dans l'ordre : une ligne n'avance que vers la droite (sauf changement d'entrée/paramètres)
+STAGE_NEW, STAGE_EXTRACTED, STAGE_DONE = "new", "extracted", "done"
+
+
+class Plan(NamedTuple):
+    """Ce qu'il reste à faire pour un fichier : 'skip', 'analyze' (texte repris) ou 'extract'"""
+    action: str
+    sha256: str
+    raw_text: Optional[str] = None
+
+
+class BatchManifest:
+    """Journal par fichier d'entrée : empreinte du contenu, paramètres, dernière étape terminée,
+    chemin de sortie. Placé dans le dossier de sortie, il suit les résultats qu'il décrit."""
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "path TEXT PRIMARY KEY, sha256 TEXT NOT NULL, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, "
+            "stage TEXT NOT NULL, extract_key TEXT, analyze_key TEXT, params TEXT, raw_text TEXT, "
+            "output TEXT, error TEXT, updated REAL NOT NULL)"
+        )
+        self._db.row_factory = sqlite3.Row
+
+    @staticmethod
+    def _key(file_path: Path) -> str:
+        return str(file_path.resolve())
+
+    def _digest(self, file_path: Path, row) -> str:
+        """Empreinte du fichier ; taille + mtime inchangés => on reprend celle du manifeste sans relire"""
+        st = file_path.stat()
+        if row is not None and row["size"] == st.st_size and row["mtime_ns"] == st.st_mtime_ns:
+            return row["sha256"]
+        return file_sha256(file_path)
+
+    def _row(self, file_path: Path):
+        return self._db.execute("SELECT * FROM files WHERE path=?", (self._key(file_path),)).fetchone()
+
+    def plan(self, file_path: Path, extract_params: Dict[str, Any], analyze_params: Dict[str, Any]) -> Plan:
+        """Compare le fichier et les paramètres courants au manifeste"""
+        with self._lock:
+            row = self._row(file_path)
+        sha = self._digest(file_path, row)
+        if row is None or row["sha256"] != sha: return Plan("extract", sha)
+        if row["extract_key"] != DiskCache.make_key(**extract_params): return Plan("extract", sha)
+        if (row["stage"] == STAGE_DONE and row["analyze_key"] == DiskCache.make_key(**analyze_params)
+                and row["output"] and Path(row["output"]).exists()):
+            return Plan("skip", sha)
+        if row["raw_text"] is not None: return Plan("analyze", sha, row["raw_text"])
+        return Plan("extract", sha)
+
+    def _upsert(self, file_path: Path, sha: str, **fields: Any):
+        st = file_path.stat()
+        fields.update(sha256=sha, size=st.st_size, mtime_ns=st.st_mtime_ns, updated=time.time())
+        cols = ", ".join(fields)
+        with self._lock:
+            self._db.execute(
+                f"INSERT INTO files(path, {cols}) VALUES (?, {', '.join('?' * len(fields))}) "
+                f"ON CONFLICT(path) DO UPDATE SET {', '.join(f'{c}=excluded.{c}' for c in fields)}",
+                (self._key(file_path), *fields.values())
+            )
+
+    def mark_extracted(self, file_path: Path, sha: str, extract_params: Dict[str, Any], raw_text: str):
+        """Point de reprise : le texte extrait est conservé, seule l'analyse LLM restera à refaire"""
+        self._upsert(file_path, sha, stage=STAGE_EXTRACTED, extract_key=DiskCache.make_key(**extract_params),
+                     analyze_key=None, raw_text=raw_text, output=None, error=None)
+
+    def mark_done(self, file_path: Path, sha: str, extract_params: Dict[str, Any],
+                  analyze_params: Dict[str, Any], output: Path):
+        params = {"extract": extract_params, "analyze": analyze_params}
+        self._upsert(file_path, sha, stage=STAGE_DONE, analyze_key=DiskCache.make_key(**analyze_params),
+                     params=json.dumps(params, ensure_ascii=False, default=str), output=str(output), error=None)
+
+    def mark_failed(self, file_path: Path, sha: str, error: str):
+        """L'étape atteinte est conservée : la prochaine exécution repart de là"""
+        st = file_path.stat()
+        with self._lock:
+            cur = self._db.execute("UPDATE files SET error=?, updated=? WHERE path=?",
+                                   (error, time.time(), self._key(file_path)))
+            if cur.rowcount: return
+            self._db.execute(
+                "INSERT INTO files(path, sha256, size, mtime_ns, stage, error, updated) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self._key(file_path), sha, st.st_size, st.st_mtime_ns, STAGE_NEW, error, time.time())
+            )
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._db.execute("SELECT stage, COUNT(*) FROM files GROUP BY stage").fetchall())
+
+    def close(self):
+        self._db.close()
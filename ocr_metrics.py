@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Instrumentation (durées par étape / par page, compteurs) pour Ultimate OCR & LLM Parser
+"""
+
+import bisect
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Optional, Dict, Any, Tuple
+
+PREFIX = "ocr_llm"
+# Bornes (s) de l'histogramme des durées : du classement (ms) à l'OCR d'une page (s)
+BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+COUNTERS_HELP = {
+    "documents": "Documents traités, par statut",
+    "pages": "Pages extraites, par mode (native / ocr)",
+    "ocr_fallbacks": "Documents PDF basculés (en tout ou partie) vers l'OCR",
+    "ocr_rerenders": "Pages re-rendues en DPI adaptatif (confiance OCR faible)",
+    "ocr_blank_pages": "Pages blanches détectées, non envoyées à Tesseract",
+    "ocr_pixels": "Pixels des pages OCR, par sort (page / tesseract / blank / cropped)",
+    "cache_hits": "Succès de cache, par cache (extract / llm)",
+    "cache_misses": "Échecs de cache, par cache (extract / llm)",
+    "llm_requests": "Appels effectifs au LLM (hors cache)",
+    "llm_prompt_tokens": "Tokens de prompt envoyés au LLM",
+    "llm_completion_tokens": "Tokens générés par le LLM",
+    "llm_errors": "Réponses LLM inexploitables ou en erreur",
+    "llm_routing": "Documents d'abord envoyés au petit modèle, par issue (small : résultat gardé / escalated : refait par --model)",
+    "llm_early_stops": "Générations LLM coupées une fois tous les champs du schéma reçus (flux)",
+    "pipeline_wait_seconds": "Mode lot : attente sur les files entre étapes, par file et côté (put : file pleine / get : file vide)",
+    "rules": "Documents passés par l'extraction par règles, par issue (complete : LLM évité / partial)",
+    "llm_pruned_tokens": "Tokens de texte retirés avant le LLM (réduction selon le schéma)",
+}
+
+# Durées du document en cours (bloc `_timings`), propagées aux tâches asyncio qu'il crée
+_TRACE: ContextVar[Optional[Dict[str, Any]]] = ContextVar("ocr_trace", default=None)
+_NOOP = nullcontext()
+
+
+class _Span:
+    __slots__ = ("metrics", "stage", "page", "start")
+
+    def __init__(self, metrics: "Metrics", stage: str, page: Optional[int]):
+        self.metrics, self.stage, self.page = metrics, stage, page
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.stage, time.perf_counter() - self.start, self.page)
+
+
+class Metrics:
+    """Durées par étape et compteurs, agrégés pour tout le processus.
+    Désactivé (par défaut), span() renvoie un contexte vide partagé et inc()/observe() sortent
+    immédiatement : le coût sur les chemins chauds se limite à un test de booléen."""
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._counters: Dict[Tuple[str, Tuple], float] = defaultdict(float)
+            # stage -> [compteurs par borne..., +Inf], somme
+            self._hist: Dict[str, list] = {}
+            self._sums: Dict[str, float] = defaultdict(float)
+
+    def span(self, stage: str, page: Optional[int] = None):
+        if not self.enabled: return _NOOP
+        return _Span(self, stage, page)
+
+    def observe(self, stage: str, seconds: float, page: Optional[int] = None):
+        if not self.enabled: return
+        with self._lock:
+            counts = self._hist.setdefault(stage, [0] * (len(BUCKETS) + 1))
+            counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+            self._sums[stage] += seconds
+        timings = _TRACE.get()
+        if timings is None: return
+        stages = timings["stages"]
+        stages[stage] = round(stages.get(stage, 0.0) + seconds, 4)
+        if page is not None:
+            per_page = timings["pages"].setdefault(str(page), {})
+            per_page[stage] = round(per_page.get(stage, 0.0) + seconds, 4)
+
+    def observe_page(self, page: int, timings: Dict[str, float]):
+        """Durées mesurées ailleurs (ex : worker du pool OCR) pour une page"""
+        if not self.enabled: return
+        for stage, seconds in timings.items():
+            self.observe(stage, seconds, page)
+
+    def inc(self, name: str, value: float = 1, **labels: str):
+        if not self.enabled or not value: return
+        with self._lock:
+            self._counters[(name, tuple(sorted(labels.items())))] += value
+
+    @contextmanager
+    def trace(self, timings: Optional[Dict[str, Any]] = None):
+        """Regroupe les durées d'un document ; on peut reprendre une trace d'un autre thread"""
+        timings = timings if timings is not None else {"stages": {}, "pages": {}}
+        if not self.enabled:
+            yield timings
+            return
+        token = _TRACE.set(timings)
+        try:
+            yield timings
+        finally:
+            _TRACE.reset(token)
+
+    def stage_totals(self) -> Dict[str, Tuple[int, float]]:
+        """stage -> (nombre de mesures, durée cumulée en s)"""
+        with self._lock:
+            return {stage: (sum(counts), self._sums[stage]) for stage, counts in self._hist.items()}
+
+    def to_prometheus(self) -> str:
+        """Format texte Prometheus (collecteur textfile de node_exporter)"""
+        def fmt(labels: Dict[str, Any]) -> str:
+            if not labels: return ""
+            return "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}"
+
+        lines = []
+        with self._lock:
+            counters = dict(self._counters)
+            hist = {stage: list(counts) for stage, counts in self._hist.items()}
+            sums = dict(self._sums)
+
+        name = f"{PREFIX}_stage_seconds"
+        lines += [f"# HELP {name} Durée des étapes du pipeline (s)", f"# TYPE {name} histogram"]
+        for stage in sorted(hist):
+            cumulative = 0
+            for bound, count in zip(BUCKETS + (float("inf"),), hist[stage]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{name}_bucket{fmt({'stage': stage, 'le': le})} {cumulative}")
+            lines.append(f"{name}_sum{fmt({'stage': stage})} {sums[stage]:.6f}")
+            lines.append(f"{name}_count{fmt({'stage': stage})} {cumulative}")
+
+        for counter in sorted({key[0] for key in counters}):
+            name = f"{PREFIX}_{counter}_total"
+            lines += [f"# HELP {name} {COUNTERS_HELP.get(counter, counter)}", f"# TYPE {name} counter"]
+            for (c, labels), value in sorted(counters.items()):
+                if c == counter: lines.append(f"{name}{fmt(dict(labels))} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: Path):
+        """Écriture atomique (le collecteur ne doit jamais lire un fichier à moitié écrit)"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        tmp.write_text(self.to_prometheus(), encoding="utf-8")
+        os.replace(tmp, path)
+
+
+# Instance partagée par l'extracteur, l'orchestrateur LLM et la CLI
+METRICS = Metrics()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Pipeline par étapes (mode lot) pour Ultimate OCR & LLM Parser : files bornées entre les étapes,
+threads par étape, profondeur des files relevée pour équilibrer les pools
+"""
+
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from ocr_metrics import METRICS
+
+logger = logging.getLogger("ocr_v3_3")
+
+# Fin de flux : chaque étape la repasse à l'étape suivante une fois tous ses threads arrêtés
+STOP = object()
+
+
+class StageQueue(queue.Queue):
+    """File bornée entre deux étapes. Relève la profondeur à chaque passage, le temps passé par les
+    producteurs bloqués (file pleine : l'étape suivante est le goulot) et par les consommateurs
+    en attente (file vide : l'étape précédente est le goulot)."""
+
+    def __init__(self, name: str, maxsize: int = 0):
+        super().__init__(maxsize)
+        self.name = name
+        self.max_depth = self.items = 0
+        self._depth_sum = 0
+        self.blocked_s = self.starved_s = 0.0
+
+    def put(self, item: Any, block: bool = True, timeout: Optional[float] = None):
+        start = time.perf_counter()
+        super().put(item, block, timeout)
+        waited = time.perf_counter() - start
+        with self.mutex:
+            self.blocked_s += waited
+            if item is not STOP: self._sample()
+        METRICS.inc("pipeline_wait_seconds", waited, queue=self.name, side="put")
+
+    def get(self, block: bool = True, timeout: Optional[float] = None) -> Any:
+        start = time.perf_counter()
+        item = super().get(block, timeout)
+        waited = time.perf_counter() - start
+        with self.mutex:
+            self.starved_s += waited
+        METRICS.inc("pipeline_wait_seconds", waited, queue=self.name, side="get")
+        return item
+
+    def _sample(self):
+        depth = len(self.queue)
+        self.items += 1
+        self._depth_sum += depth
+        self.max_depth = max(self.max_depth, depth)
+
+    def stats(self) -> Dict[str, Any]:
+        with self.mutex:
+            return {"queue": self.name, "capacity": self.maxsize, "items": self.items, "max_depth": self.max_depth,
+                    "mean_depth": self._depth_sum / self.items if self.items else 0.0,
+                    "blocked_s": self.blocked_s, "starved_s": self.starved_s}
+
+    def summary(self) -> str:
+        st = self.stats()
+        return (f"{self.name} {st['mean_depth']:.1f}/{st['capacity'] or '∞'} en moy. (max {st['max_depth']}), "
+                f"amont bloqué {st['blocked_s']:.1f}s, aval en attente {st['starved_s']:.1f}s")
+
+
+class Stage:
+    """`threads` threads lisent `inbox` et appellent handler(élément) ; le handler gère ses propres
+    erreurs (une exception non prévue est journalisée, l'étape continue). Quand le dernier thread
+    a lu STOP, on_done() est appelé une fois (typiquement : STOP vers l'étape suivante)."""
+
+    def __init__(self, name: str, handler: Callable[[Any], None], inbox: StageQueue, threads: int = 1,
+                 on_done: Optional[Callable[[], None]] = None):
+        self.name, self.handler, self.inbox, self.on_done = name, handler, inbox, on_done
+        self._left = threads
+        self._lock = threading.Lock()
+        self._threads = [threading.Thread(target=self._run, name=f"{name}-{i}", daemon=True) for i in range(threads)]
+        for t in self._threads: t.start()
+
+    def _run(self):
+        while True:
+            item = self.inbox.get()
+            if item is STOP:
+                # Pour les autres threads de l'étape
+                self.inbox.put(STOP)
+                break
+            try:
+                self.handler(item)
+            except Exception:
+                logger.exception(f"❌ Étape {self.name}")
+        with self._lock:
+            self._left -= 1
+            last = self._left == 0
+        if last and self.on_done: self.on_done()
+
+    def join(self):
+        for t in self._threads: t.join()
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Service local d'extraction (HTTP ou socket Unix) pour Ultimate OCR & LLM Parser
+
+    POST /jobs?name=doc.pdf&type=auto   corps = contenu du fichier  -> 202 {"id": ...}
+    POST /jobs  {"path": "/abs/doc.pdf", "type": "cv"}            -> 202 {"id": ...}
+    GET  /jobs/<id>?wait=10                                        -> état (+ champs déjà reçus, résultat)
+    GET  /health                                                   -> état du service
+    GET  /metrics                                                  -> métriques Prometheus
+"""
+
+import argparse
+import hashlib
+import json
+import shutil
+import signal
+import socket
+import socketserver
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional, Dict, Any
+from urllib.parse import urlparse, parse_qs
+
+from ocr_extractor import (
+    SmartExtractor, AsyncLLMRunner, SUPPORTED_EXTS,
+    add_pipeline_args, analyze_document, make_cache, make_llm, make_ocr_engine, make_store, warm_worker, console, logger
+)
+from ocr_metrics import METRICS, PREFIX
+
+DOC_TYPES = ('auto', 'cv', 'facture', 'formulaire')
+
+
+class Job:
+    __slots__ = ("id", "name", "path", "doc_type", "use_llm", "owned", "sha256", "status", "result", "error",
+                 "partial", "created", "finished", "timings", "done")
+
+    def __init__(self, name: str, path: Path, doc_type: str, use_llm: bool, owned: bool, sha256: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.name, self.path, self.doc_type, self.use_llm = name, path, doc_type, use_llm
+        # owned : fichier téléversé dans le spool, supprimé une fois le travail terminé
+        self.owned, self.sha256 = owned, sha256
+        self.status = "queued"
+        self.result = self.error = None
+        # Champs de premier niveau reçus du LLM pendant l'analyse (réponse en flux)
+        self.partial: Dict[str, Any] = {}
+        self.created, self.finished = time.time(), None
+        self.timings: Dict[str, Any] = {"stages": {}, "pages": {}}
+        self.done = threading.Event()
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {"id": self.id, "name": self.name, "status": self.status, "created": self.created}
+        if self.finished: data["duration_s"] = round(self.finished - self.created, 3)
+        if self.status == "analyzing" and self.partial: data["partial"] = dict(self.partial)
+        if self.status == "done": data.update(result=self.result, _timings=self.timings)
+        if self.error: data["error"] = self.error
+        return data
+
+
+class QueueFull(Exception):
+    pass
+
+
+class ExtractionService:
+    """Workers OCR préchauffés + file bornée : au-delà de `queue_size` travaux en cours,
+    les nouvelles demandes sont refusées (l'appelant réessaie plus tard)."""
+
+    def __init__(self, args, queue_size: int = 64, keep_results: int = 1000):
+        self.args = args
+        self.queue_size = queue_size
+        self.keep_results = keep_results
+        self.started = time.time()
+        self.spool = Path(tempfile.mkdtemp(prefix="ocr_spool_"))
+        self._slots = threading.BoundedSemaphore(queue_size)
+        self._lock = threading.Lock()
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+
+        # Processus OCR lancés et moteurs chargés dès le démarrage, pas à la première requête
+        self.pool = ProcessPoolExecutor(max_workers=args.workers, initializer=warm_worker, initargs=(args.ocr_engine,))
+        for fut in [self.pool.submit(time.sleep, 0.05) for _ in range(args.workers)]: fut.result()
+        self.doc_pool = ThreadPoolExecutor(max_workers=args.workers, thread_name_prefix="doc")
+        self.runner = AsyncLLMRunner(max_in_flight=args.llm_parallel)
+        self.extractor = SmartExtractor(executor=self.pool, cache=make_cache(args), engine=make_ocr_engine(args.ocr_engine),
+                                        dpi=args.dpi, layout=args.layout)
+        self.llm = make_llm(args)
+        self.llm.start_warm_up()
+        # Chaque résultat est visible dans la base dès la fin du travail
+        self.store = make_store(args, batch_size=1)
+        logger.info(f"🔥 {args.workers} workers OCR prêts ({args.ocr_engine})")
+
+    # --- Soumission ---
+
+    def submit(self, name: str, doc_type: str = 'auto', use_llm: bool = True,
+               data: Optional[bytes] = None, path: Optional[Path] = None) -> Job:
+        suffix = Path(name).suffix.lower()
+        if suffix not in SUPPORTED_EXTS: raise ValueError(f"Format non supporté: {suffix or name}")
+        if doc_type not in DOC_TYPES: raise ValueError(f"Type inconnu : {doc_type}")
+        if path is not None and not path.is_file(): raise ValueError(f"Fichier introuvable : {path}")
+        if not self._slots.acquire(blocking=False): raise QueueFull()
+
+        sha256 = None
+        if data is not None:
+            path = self.spool / f"{uuid.uuid4().hex}{suffix}"
+            path.write_bytes(data)
+            sha256 = hashlib.sha256(data).hexdigest()
+        job = Job(name, path, doc_type, use_llm, owned=data is not None, sha256=sha256)
+        with self._lock:
+            self.jobs[job.id] = job
+        self.doc_pool.submit(self._extract, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    # --- Traitement ---
+
+    def _extract(self, job: Job):
+        job.status = "extracting"
+        try:
+            with METRICS.trace(job.timings):
+                raw_md = self.extractor.extract(job.path)
+        except Exception as e:
+            return self._finish(job, error=str(e))
+        if not job.use_llm: return self._finish(job, result={"texte": raw_md})
+        job.status = "analyzing"
+        fut = self.runner.submit(self._analyze(job, raw_md))
+        fut.add_done_callback(lambda f: self._finish(job, error=str(f.exception())) if f.exception() else None)
+
+    async def _analyze(self, job: Job, raw_md: str):
+        with METRICS.trace(job.timings):
+            doc_type, data = await analyze_document(raw_md, job.doc_type, self.llm, self.runner.client,
+                                                    on_field=job.partial.__setitem__)
+        # Téléversement : clé = contenu (deux "scan.pdf" différents ne s'écrasent pas), nom du client affiché à part
+        if self.store:
+            source = f"upload:{job.sha256}" if job.owned else job.path.resolve()
+            self.store.add(source, doc_type, data, job.sha256, name=job.name if job.owned else None)
+        self._finish(job, result={"type": doc_type, "data": data})
+
+    def _finish(self, job: Job, result: Optional[Dict] = None, error: Optional[str] = None):
+        job.result, job.error = result, error
+        job.status = "error" if error else "done"
+        job.finished = time.time()
+        METRICS.inc("documents", status="error" if error else "ok")
+        if error: logger.error(f"❌ {job.name} : {error}")
+        if job.owned: job.path.unlink(missing_ok=True)
+        self._slots.release()
+        job.done.set()
+        self._prune()
+
+    def _prune(self):
+        """Ne garde que les `keep_results` derniers travaux terminés"""
+        with self._lock:
+            finished = [jid for jid, j in self.jobs.items() if j.done.is_set()]
+            for jid in finished[:max(0, len(finished) - self.keep_results)]:
+                del self.jobs[jid]
+
+    # --- Supervision ---
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            statuses = [j.status for j in self.jobs.values()]
+        return {s: statuses.count(s) for s in ("queued", "extracting", "analyzing", "done", "error")}
+
+    def health(self) -> Dict[str, Any]:
+        counts = self.counts()
+        in_progress = counts["queued"] + counts["extracting"] + counts["analyzing"]
+        return {
+            "status": "ok", "uptime_s": round(time.time() - self.started, 1), "workers": self.args.workers,
+            "ocr_engine": self.args.ocr_engine, "model": self.args.model,
+            "in_progress": in_progress, "capacity": self.queue_size, "jobs": counts,
+        }
+
+    def metrics(self) -> str:
+        counts = self.counts()
+        lines = [f"# HELP {PREFIX}_jobs Travaux connus du service, par statut", f"# TYPE {PREFIX}_jobs gauge"]
+        lines += [f'{PREFIX}_jobs{{status="{s}"}} {n}' for s, n in counts.items()]
+        lines += [f"# HELP {PREFIX}_queue_capacity Travaux simultanés acceptés", f"# TYPE {PREFIX}_queue_capacity gauge",
+                  f"{PREFIX}_queue_capacity {self.queue_size}",
+                  f"# HELP {PREFIX}_workers Processus OCR", f"# TYPE {PREFIX}_workers gauge",
+                  f"{PREFIX}_workers {self.args.workers}"]
+        return METRICS.to_prometheus() + "\n".join(lines) + "\n"
+
+    def close(self):
+        self.doc_pool.shutdown(wait=True)
+        self.runner.close()
+        self.pool.shutdown()
+        if self.store: self.store.close()
+        shutil.rmtree(self.spool, ignore_errors=True)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive : pas de nouvelle connexion par requête
+    server_version = "OCRLLM/3.3"
+
+    @property
+    def service(self) -> ExtractionService:
+        return self.server.service
+
+    def _send(self, code: int, payload: Any, content_type: str = "application/json", headers: Optional[Dict] = None):
+        body = payload.encode("utf-8") if isinstance(payload, str) else json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items(): self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/health": return self._send(200, self.service.health())
+        if url.path == "/metrics": return self._send(200, self.service.metrics(), "text/plain; version=0.0.4")
+        if url.path.startswith("/jobs/"):
+            job = self.service.get(url.path[len("/jobs/"):])
+            if job is None: return self._send(404, {"error": "travail inconnu"})
+            # Attente longue optionnelle : évite de sonder en boucle
+            try:
+                wait = float(parse_qs(url.query).get("wait", ["0"])[0])
+            except ValueError:
+                return self._send(400, {"error": "wait : nombre de secondes attendu"})
+            if wait > 0: job.done.wait(min(wait, 60.0))
+            return self._send(200, job.to_dict())
+        self._send(404, {"error": "route inconnue"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            if length < 0: raise ValueError
+        except ValueError:
+            # Corps de longueur inconnue : impossible de le lire puis de réutiliser la connexion
+            self.close_connection = True
+            return self._send(400, {"error": "Content-Length invalide"})
+        if url.path != "/jobs":
+            self.rfile.read(length)
+            return self._send(404, {"error": "route inconnue"})
+        if length > self.server.max_upload:
+            self.close_connection = True
+            return self._send(413, {"error": f"fichier > {self.server.max_upload // (1024 * 1024)} Mo"})
+        body = self.rfile.read(length)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        try:
+            if self.headers.get("Content-Type", "").startswith("application/json"):
+                spec = json.loads(body or b"{}")
+                if not isinstance(spec, dict): raise ValueError("objet JSON attendu : {\"path\": ...}")
+                path = Path(spec["path"])
+                job = self.service.submit(path.name, spec.get("type", "auto"), spec.get("llm", True), path=path)
+            else:
+                job = self.service.submit(params.get("name", ""), params.get("type", "auto"),
+                                          params.get("llm", "1") not in ("0", "false"), data=body)
+        except QueueFull:
+            return self._send(503, {"error": "file pleine, réessayez plus tard"}, headers={"Retry-After": "1"})
+        except (ValueError, KeyError, TypeError) as e:
+            return self._send(400, {"error": str(e)})
+        self._send(202, {"id": job.id, "status": job.status}, headers={"Location": f"/jobs/{job.id}"})
+
+    def log_message(self, fmt, *args):
+        logger.debug(fmt % args)
+
+
+class _UnixHTTPServer(ThreadingHTTPServer):
+    address_family = socket.AF_UNIX
+
+    def server_bind(self):
+        socketserver.TCPServer.server_bind(self)
+        self.server_name, self.server_port = "localhost", 0
+
+    def get_request(self):
+        request, _ = super().get_request()
+        return request, ("local", 0)
+
+
+def make_server(service: ExtractionService, host: str = "127.0.0.1", port: int = 8765,
+                unix_socket: Optional[Path] = None, max_upload_mb: int = 50) -> ThreadingHTTPServer:
+    if unix_socket:
+        Path(unix_socket).unlink(missing_ok=True)
+        server = _UnixHTTPServer(str(unix_socket), _Handler)
+    else:
+        server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    server.service = service
+    server.max_upload = max_upload_mb * 1024 * 1024
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Service local d'extraction OCR + LLM")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", type=Path, help="Écoute sur un socket Unix plutôt qu'en TCP")
+    parser.add_argument("--queue-size", type=int, default=64, help="Travaux simultanés acceptés avant de répondre 503")
+    parser.add_argument("--max-upload", type=int, default=50, help="Taille max d'un fichier téléversé (Mo)")
+    add_pipeline_args(parser)
+    args = parser.parse_args()
+    METRICS.enabled = True
+
+    service = ExtractionService(args, queue_size=args.queue_size)
+    try:
+        server = make_server(service, args.host, args.port, args.unix, args.max_upload)
+    except OSError:
+        # Port déjà pris, socket inaccessible : pas de processus OCR ni de spool laissés derrière
+        service.close()
+        raise
+    where = args.unix or f"http://{args.host}:{server.server_port}"
+    console.print(f"🚀 Service d'extraction : {where}")
+    # SIGTERM (systemd, docker stop) : même arrêt propre que Ctrl+C (processus OCR arrêtés, spool supprimé).
+    # shutdown() attend la fin de serve_forever : appelé depuis un autre thread que celui qui sert
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown, daemon=True).start())
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        if args.unix: Path(args.unix).unlink(missing_ok=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Base de résultats (SQLite) pour Ultimate OCR & LLM Parser : champs clés normalisés et indexés
+
+    python ocr_store.py --db output/results.sqlite factures --siret 73282932000074 --min-ttc 10000
+    python ocr_store.py candidats --email jean@exemple.fr
+    python ocr_store.py formulaires --titre "préinscription"
+"""
+
+import argparse
+import json
+import re
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Dict, Any, List
+
+DEFAULT_STORE = Path("output") / "results.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY, source TEXT NOT NULL UNIQUE, sha256 TEXT, doc_type TEXT NOT NULL,
+    created REAL NOT NULL, data TEXT NOT NULL, name TEXT);
+CREATE INDEX IF NOT EXISTS idx_documents_type ON documents(doc_type);
+
+CREATE TABLE IF NOT EXISTS factures (
+    doc_id INTEGER PRIMARY KEY REFERENCES documents(id) ON DELETE CASCADE,
+    numero TEXT, date_emission TEXT, emetteur TEXT, siret TEXT, iban TEXT, client TEXT,
+    total_ht REAL, total_tva REAL, total_ttc REAL, devise TEXT);
+CREATE INDEX IF NOT EXISTS idx_factures_siret ON factures(siret, total_ttc);
+CREATE INDEX IF NOT EXISTS idx_factures_numero ON factures(numero);
+CREATE INDEX IF NOT EXISTS idx_factures_iban ON factures(iban);
+CREATE INDEX IF NOT EXISTS idx_factures_ttc ON factures(total_ttc);
+
+CREATE TABLE IF NOT EXISTS candidats (
+    doc_id INTEGER PRIMARY KEY REFERENCES documents(id) ON DELETE CASCADE,
+    nom TEXT, email TEXT, telephone TEXT);
+CREATE INDEX IF NOT EXISTS idx_candidats_email ON candidats(email);
+CREATE INDEX IF NOT EXISTS idx_candidats_telephone ON candidats(telephone);
+
+CREATE TABLE IF NOT EXISTS formulaires (
+    doc_id INTEGER PRIMARY KEY REFERENCES documents(id) ON DELETE CASCADE,
+    titre TEXT, titre_norm TEXT);
+CREATE INDEX IF NOT EXISTS idx_formulaires_titre ON formulaires(titre_norm);
+"""
+
+# --- NORMALISATION ---
+# Valeurs de gabarit laissées par le LLM : "[SIRET du client]", "A déduire", "Ex: Dupont"...
+_PLACEHOLDER = re.compile(r"^\s*(\[.*\]|a déduire|ex\s*:.*|n/?a|null|none|-+)\s*$", re.I)
+_IBAN = re.compile(r"^[A-Z]{2}\d{2}[A-Z0-9]{10,30}$")
+
+
+def norm_text(value: Any) -> Optional[str]:
+    if value is None or isinstance(value, (dict, list)): return None
+    text = " ".join(str(value).split())
+    return None if not text or _PLACEHOLDER.match(text) else text
+
+
+def norm_amount(value: Any) -> Optional[float]:
+    """'1 500,00 €', '1.500,00', '1,500.00', 1500 -> 1500.0"""
+    if isinstance(value, bool): return None
+    if isinstance(value, (int, float)): return float(value)
+    text = re.sub(r"[^\d,.\-]", "", str(value or ""))
+    if not re.search(r"\d", text): return None
+    if "," in text and "." in text:
+        # Le dernier séparateur est le séparateur décimal
+        thousands = "." if text.rfind(",") > text.rfind(".") else ","
+        text = text.replace(thousands, "")
+    text = text.replace(",", ".")
+    if text.count(".") > 1: text = text.replace(".", "", text.count(".") - 1)
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+def norm_digits(value: Any, min_len: int) -> Optional[str]:
+    """SIRET / SIREN / téléphone : chiffres seuls (les numéros trop courts sont des débris OCR)"""
+    digits = re.sub(r"\D", "", str(value or ""))
+    return digits if len(digits) >= min_len else None
+
+
+def norm_iban(value: Any) -> Optional[str]:
+    iban = re.sub(r"[^A-Za-z0-9]", "", str(value or "")).upper()
+    return iban if _IBAN.match(iban) else None
+
+
+def norm_email(value: Any) -> Optional[str]:
+    email = str(value or "").strip().lower()
+    return email if re.fullmatch(r"[^@\s]+@[^@\s]+\.[a-z]{2,}", email) else None
+
+
+def _section(data: Dict, key: str) -> Dict:
+    value = data.get(key)
+    return value if isinstance(value, dict) else {}
+
+
+class ResultStore:
+    """Résultats de merge_data dans une base SQLite. Les documents sont mis en tampon puis insérés
+    par lots (une transaction par lot) ; le JSON complet est gardé à côté des champs indexés."""
+
+    def __init__(self, db_path: Path = DEFAULT_STORE, batch_size: int = 100):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.batch_size = batch_size
+        self._pending: List[tuple] = []
+        # Le mode lot et le service ajoutent depuis plusieurs threads
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA foreign_keys=ON")
+        self._db.executescript(SCHEMA)
+        # Bases créées avant la colonne name : nom affiché = source
+        if "name" not in {row[1] for row in self._db.execute("PRAGMA table_info(documents)")}:
+            self._db.execute("ALTER TABLE documents ADD COLUMN name TEXT")
+            self._db.execute("UPDATE documents SET name = source")
+        self._db.row_factory = sqlite3.Row
+
+    def add(self, source: str, doc_type: str, data: Dict, sha256: Optional[str] = None, name: Optional[str] = None):
+        """source : clé unique du document (un ajout de même source remplace le précédent) ;
+        name : nom affiché, par défaut la source (fichier téléversé : nom donné par le client)"""
+        with self._lock:
+            self._pending.append((str(source), sha256, doc_type, data, name or str(source)))
+            if len(self._pending) >= self.batch_size: self._flush()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if not self._pending: return
+        now = time.time()
+        self._db.execute("BEGIN")
+        try:
+            for source, sha256, doc_type, data, name in self._pending:
+                # Un document retraité remplace l'ancien (et ses lignes indexées, par cascade)
+                self._db.execute("DELETE FROM documents WHERE source=?", (source,))
+                doc_id = self._db.execute(
+                    "INSERT INTO documents(source, sha256, doc_type, created, data, name) VALUES (?, ?, ?, ?, ?, ?)",
+                    (source, sha256, doc_type, now, json.dumps(data, ensure_ascii=False), name)
+                ).lastrowid
+                self._index(doc_id, doc_type, data)
+            self._db.execute("COMMIT")
+        except Exception:
+            self._db.execute("ROLLBACK")
+            raise
+        self._pending.clear()
+
+    def _index(self, doc_id: int, doc_type: str, data: Dict):
+        if doc_type == "facture":
+            doc, emetteur, totaux = _section(data, "document"), _section(data, "emetteur"), _section(data, "totaux")
+            self._db.execute(
+                "INSERT INTO factures VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (doc_id, norm_text(doc.get("numero")), norm_text(doc.get("date_emission")),
+                 norm_text(emetteur.get("nom")), norm_digits(emetteur.get("siret"), 9), norm_iban(emetteur.get("iban")),
+                 norm_text(_section(data, "client").get("nom")), norm_amount(totaux.get("total_ht")),
+                 norm_amount(totaux.get("total_tva")), norm_amount(totaux.get("total_ttc")),
+                 (norm_text(totaux.get("devise")) or "").upper() or None)
+            )
+        elif doc_type == "cv":
+            c = _section(data, "candidat")
+            self._db.execute("INSERT INTO candidats VALUES (?, ?, ?, ?)",
+                             (doc_id, norm_text(c.get("nom")), norm_email(c.get("email")),
+                              norm_digits(c.get("telephone"), 8)))
+        elif doc_type == "formulaire":
+            titre = norm_text(data.get("titre_formulaire"))
+            # LIKE / NOCASE de SQLite ne replient que l'ASCII (É ≠ é) : la recherche porte sur une copie casefold
+            self._db.execute("INSERT INTO formulaires VALUES (?, ?, ?)", (doc_id, titre, titre.casefold() if titre else None))
+
+    # --- Requêtes ---
+
+    def query(self, table: str, where: Dict[str, Any]) -> List[sqlite3.Row]:
+        """where : {"colonne op": valeur}, op parmi = >= <= LIKE (valeurs déjà normalisées)"""
+        clauses, values = [], []
+        for key, value in where.items():
+            if value is None: continue
+            column, op = key.split()
+            clauses.append(f"t.{column} {op} ?")
+            values.append(value)
+        sql = (f"SELECT t.*, d.source, d.name, d.data FROM {table} t JOIN documents d ON d.id = t.doc_id"
+               + (" WHERE " + " AND ".join(clauses) if clauses else "") + " ORDER BY d.id")
+        with self._lock:
+            return self._db.execute(sql, values).fetchall()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._db.execute("SELECT doc_type, COUNT(*) FROM documents GROUP BY doc_type").fetchall())
+
+    def close(self):
+        self.flush()
+        self._db.close()
+
+
+# --- CLI DE REQUÊTE ---
+
+TABLE_COLUMNS = {
+    "factures": ["name", "numero", "date_emission", "emetteur", "siret", "total_ttc", "devise"],
+    "candidats": ["name", "nom", "email", "telephone"],
+    "formulaires": ["name", "titre"],
+}
+
+
+def _filters(args) -> Dict[str, Any]:
+    if args.table == "factures":
+        return {"siret =": norm_digits(args.siret, 9) if args.siret else None,
+                "numero =": args.numero, "iban =": norm_iban(args.iban) if args.iban else None,
+                "total_ttc >=": args.min_ttc, "total_ttc <=": args.max_ttc}
+    if args.table == "candidats":
+        return {"email =": norm_email(args.email) if args.email else None,
+                "telephone =": norm_digits(args.telephone, 8) if args.telephone else None}
+    return {"titre_norm LIKE": f"%{args.titre.casefold()}%" if args.titre else None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Interroge la base de résultats (--store du mode lot)")
+    parser.add_argument("--db", type=Path, default=DEFAULT_STORE, help="Base SQLite des résultats")
+    output = argparse.ArgumentParser(add_help=False)
+    output.add_argument("--json", action="store_true", help="Affiche le JSON complet des documents (une ligne par document)")
+    sub = parser.add_subparsers(dest="table", required=True)
+    p = sub.add_parser("factures", parents=[output], help="Factures par SIRET, numéro, IBAN ou montant TTC")
+    p.add_argument("--siret")
+    p.add_argument("--numero")
+    p.add_argument("--iban")
+    p.add_argument("--min-ttc", type=float)
+    p.add_argument("--max-ttc", type=float)
+    p = sub.add_parser("candidats", parents=[output], help="CVs par email ou téléphone")
+    p.add_argument("--email")
+    p.add_argument("--telephone")
+    p = sub.add_parser("formulaires", parents=[output], help="Formulaires par titre (sous-chaîne)")
+    p.add_argument("--titre")
+    sub.add_parser("stats", help="Nombre de documents par type")
+    args = parser.parse_args()
+
+    if not args.db.exists(): sys.exit(f"❌ Base introuvable : {args.db}")
+    store = ResultStore(args.db)
+    try:
+        if args.table == "stats":
+            for doc_type, count in sorted(store.stats().items()): print(f"{doc_type}\t{count}")
+            return
+        rows = store.query(args.table, _filters(args))
+        if args.json:
+            for row in rows: print(json.dumps({"source": row["source"], "name": row["name"], "data": json.loads(row["data"])}, ensure_ascii=False))
+            return
+        from rich.console import Console
+        from rich.table import Table
+        table = Table(title=f"{args.table} ({len(rows)})")
+        for column in TABLE_COLUMNS[args.table]: table.add_column(column)
+        for row in rows: table.add_row(*("" if row[c] is None else str(row[c]) for c in TABLE_COLUMNS[args.table]))
+        Console().print(table)
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -16,6 +16,8 @@ echo.
 echo [2/3] Compilation en cours...
 echo Cela peut prendre 1 a 2 minutes.
 echo Inclusion des bibliotheques graphiques (CustomTkinter, TkinterDnD)...
+rem ocr_extractor importe PyMuPDF, OpenCV, numpy, Tesseract et Ollama a la demande (importlib) :
+rem PyInstaller ne voit pas ces imports, ils sont declares ci-dessous
 cd ..
 
 pyinstaller --noconsole --onefile ^
@@ -24,6 +26,15 @@ pyinstaller --noconsole --onefile ^
     --collect-all "tkinterdnd2" ^
     --hidden-import "PIL._tkinter_finder" ^
     --hidden-import "babel.numbers" ^
+    --collect-all "pymupdf" ^
+    --collect-all "pymupdf4llm" ^
+    --collect-all "cv2" ^
+    --hidden-import "fitz" ^
+    --hidden-import "numpy" ^
+    --hidden-import "pytesseract" ^
+    --hidden-import "ollama" ^
+    --hidden-import "httpx" ^
+    --hidden-import "asyncio" ^
     ocr_gui.py
 
 if %errorlevel% neq 0 (
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Tests du cache disque (taille tenue à jour, éviction LRU, TTL) : python -m pytest -q"""
+
+import time
+
+from ocr_cache import DiskCache
+
+
+def test_total_follows_puts_and_replacements(tmp_path):
+    cache = DiskCache(tmp_path / "c.sqlite", max_bytes=10_000)
+    cache.put("a", "x" * 100)
+    cache.put("b", "x" * 50)
+    cache.put("a", "y" * 10)
+    assert cache.stats()["bytes"] == 60
+    cache.close()
+    # Total relu à l'ouverture
+    assert DiskCache(tmp_path / "c.sqlite")._total == 60
+
+
+def test_eviction_drops_least_recently_used(tmp_path):
+    cache = DiskCache(tmp_path / "c.sqlite", max_bytes=1000)
+    for i in range(10): cache.put(f"k{i}", "x" * 100)
+    assert cache.get("k0") is not None
+    cache.put("k10", "x" * 100)
+    assert cache.get("k0") is not None
+    assert cache.get("k1") is None
+    stats = cache.stats()
+    assert stats["bytes"] <= 1000 and stats["evictions"] >= 1
+
+
+def test_expired_entries_leave_the_total(tmp_path):
+    cache = DiskCache(tmp_path / "c.sqlite", ttl=0.05)
+    cache.put("a", "x" * 100)
+    time.sleep(0.1)
+    assert cache.get("a") is None
+    cache.put("b", "x" * 10)
+    assert cache.stats()["bytes"] == cache._total == 10
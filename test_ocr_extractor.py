@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Tests des fonctions pures d'ocr_extractor (sans Tesseract ni Ollama) : python -m pytest -q"""
+
+import pytest
+
+from ocr_extractor import JSONStreamParser, RuleExtractor, TextScanner, prune_for_schema, validate_result
+
+
+# --- RuleExtractor ---
+
+@pytest.mark.parametrize("header", ["Page 1/2", "www.acme-fournitures.fr", "Bon de livraison"])
+def test_invoice_header_without_issuer_cue_left_to_llm(header):
+    result = RuleExtractor().extract(f"{header}\nFacture n° F-2024-12\nClient : Dupont SARL", "facture")
+    assert "nom" not in result.data["emetteur"]
+    assert "nom" in result.missing["emetteur"]
+
+
+@pytest.mark.parametrize("text, name", [
+    ("ACME SARL — 12 rue des Lilas, 75001 Paris\nFacture n° 12", "ACME SARL"),
+    ("Dupont Conseil\n12 rue des Lilas 75001 Paris\nSIRET 732 829 320 00074\nFacture n° 12", "Dupont Conseil"),
+])
+def test_invoice_issuer_with_legal_form_or_identifier(text, name):
+    assert RuleExtractor().extract(text, "facture").data["emetteur"]["nom"] == name
+
+
+INVOICE = "ACME SARL\nFacture n° F-12\nTotal HT : 1 250,00 €\nTVA 20 % : 250,00 €\nTotal TTC : {ttc} €"
+
+
+def test_invoice_totals_read_after_labels():
+    totaux = RuleExtractor().extract(INVOICE.format(ttc="1 500,00"), "facture").data["totaux"]
+    assert (totaux["total_ht"], totaux["total_tva"], totaux["total_ttc"]) == (1250.0, 250.0, 1500.0)
+
+
+def test_invoice_totals_dropped_when_inconsistent():
+    totaux = RuleExtractor().extract(INVOICE.format(ttc="1 900,00"), "facture").data["totaux"]
+    assert "total_ttc" not in totaux and "total_ht" not in totaux
+
+
+def test_cv_name_taken_next_to_contact_line():
+    text = "CURRICULUM VITAE\nJean Dupont\njean.dupont@mail.fr | 06 12 34 56 78\nEXPÉRIENCES"
+    candidat = RuleExtractor().extract(text, "cv").data["candidat"]
+    assert candidat["nom"] == "Jean Dupont"
+    assert candidat["email"] == "jean.dupont@mail.fr"
+
+
+def test_cv_job_title_is_not_a_name():
+    candidat = RuleExtractor().extract("Développeur Python\njean.dupont@mail.fr | 06 12 34 56 78", "cv").data["candidat"]
+    assert "nom" not in candidat
+
+
+# --- TextScanner ---
+
+def test_scanner_counts_keywords_as_substrings_with_cap():
+    scan = TextScanner().scan("Expériences " * 10 + "montants")
+    assert scan.keywords["expérience"] == 5
+    assert scan.keywords["montant"] == 1
+
+
+def test_scanner_entities():
+    scan = TextScanner().scan("jean@ex.fr, JEAN@EX.FR, tél. +33 6 12 34 56 78\n"
+                              "IBAN FR76 3000 6000 0112 3456 7890 189 — linkedin.com/in/jdupont, 12 €")
+    assert scan.emails == ["jean@ex.fr"]
+    # Pas de faux numéro de téléphone lu dans l'IBAN
+    assert scan.phones == ["+33 6 12 34 56 78"]
+    assert scan.ibans == ["FR7630006000011234567890189"]
+    assert scan.linkedins == ["linkedin.com/in/jdupont"]
+    assert scan.has_currency and scan.has_profile_site
+
+
+# --- validate_result ---
+
+def test_validate_result_accepts_consistent_invoice():
+    text = "Facture F-12 ACME SARL contact@acme.fr"
+    data = {"document": {"numero": "F-12"}, "emetteur": {"nom": "ACME SARL", "email": "contact@acme.fr"},
+            "totaux": {"total_ht": 100, "total_tva": 20, "total_ttc": 120}}
+    assert validate_result(data, text, "facture") == []
+
+
+def test_validate_result_reports_issues():
+    data = {"document": {"numero": "F-12"}, "emetteur": {"nom": "", "email": "autre@acme.fr", "telephone": "06 99 99 99 99"},
+            "totaux": {"total_ht": 100, "total_tva": 20, "total_ttc": 150}}
+    issues = validate_result(data, "Facture F-12 contact@acme.fr 06 12 34 56 78", "facture")
+    assert "emetteur.nom vide" in issues
+    assert any(i.startswith("HT + TVA") for i in issues)
+    assert any(i.startswith("email absent") for i in issues)
+    assert any(i.startswith("téléphone absent") for i in issues)
+
+
+def test_validate_result_error_response():
+    assert validate_result({"error": "timeout"}, "", "cv") == ["réponse inexploitable (timeout)"]
+
+
+# --- prune_for_schema ---
+
+def test_prune_invoice_keeps_fields_and_drops_prose():
+    body = "\n".join(["ACME SARL", "Facture n° F-12"] + [f"en-tête {w}" for w in "abcdefghij"])
+    text = (f"{body}\nMerci pour votre confiance, nous espérons vous revoir très bientôt dans nos locaux.\n"
+            + "Page 1/3\n" * 3 + "Total TTC : 12,00 €")
+    pruned = prune_for_schema(text, "facture")
+    assert "Merci pour votre confiance" not in pruned.text
+    assert "Total TTC : 12,00 €" in pruned.text
+    assert "Page 1/3" not in pruned.text
+    assert pruned.tokens_after < pruned.tokens_before
+
+
+def test_prune_repeated_page_header_kept_once():
+    text = "\n".join(f"Page {i}/3\nParagraphe {w}" for i, w in zip((1, 2, 3), "abc"))
+    assert prune_for_schema(text, "generique").text == "Page 1/3\nParagraphe a\nParagraphe b\nParagraphe c"
+
+
+def test_prune_cv_drops_sections_outside_schema():
+    text = "Jean Dupont\nEXPÉRIENCES\nDéveloppeur chez X\nLOISIRS\nRandonnée et photo\nFORMATION\nMaster"
+    pruned = prune_for_schema(text, "cv").text
+    assert "Développeur chez X" in pruned and "Master" in pruned
+    assert "Randonnée" not in pruned
+
+
+def test_prune_budget_keeps_amounts_first():
+    text = "\n".join(f"Désignation article {i}" for i in range(200)) + "\nTotal TTC : 12,00 €"
+    pruned = prune_for_schema(text, "facture", budget_tokens=50)
+    assert pruned.tokens_after <= 50
+    assert "Total TTC : 12,00 €" in pruned.text
+
+
+# --- JSONStreamParser ---
+
+def test_stream_parser_emits_fields_as_they_close():
+    parser = JSONStreamParser()
+    assert parser.feed('```json\n{"nom": "Du') == []
+    assert parser.feed('pont", "liste": [1, {"a": "}"}') == [("nom", "Dupont")]
+    assert parser.feed('], "n": 3') == [("liste", [1, {"a": "}"}])]
+    assert parser.feed("}") == [("n", 3)]
+    assert parser.closed
+    assert parser.fields == {"nom": "Dupont", "liste": [1, {"a": "}"}], "n": 3}
+
+
+def test_stream_parser_skips_unreadable_field():
+    parser = JSONStreamParser()
+    parser.feed('{"a": tru, "b": "x\\"y"}')
+    assert parser.fields == {"b": 'x"y'}
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Tests de la reprise de lot (BatchManifest.plan) : python -m pytest -q"""
+
+import os
+
+import pytest
+
+from ocr_manifest import BatchManifest
+
+EXTRACT = {"lang": "fra", "dpi": 300}
+ANALYZE = {"model": "qwen2.5:3b", "prune": True}
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    m = BatchManifest(tmp_path / "out" / ".manifest.sqlite")
+    yield m
+    m.close()
+
+
+@pytest.fixture
+def scan(tmp_path):
+    path = tmp_path / "scan.pdf"
+    path.write_bytes(b"%PDF-1.4 facture")
+    return path
+
+
+def _done(manifest, scan, tmp_path):
+    output = tmp_path / "out" / "scan_data.json"
+    output.write_text("{}", encoding="utf-8")
+    sha = manifest.plan(scan, EXTRACT, ANALYZE).sha256
+    manifest.mark_extracted(scan, sha, EXTRACT, "texte brut")
+    manifest.mark_done(scan, sha, EXTRACT, ANALYZE, output)
+    return output
+
+
+def test_new_file_is_extracted(manifest, scan):
+    assert manifest.plan(scan, EXTRACT, ANALYZE).action == "extract"
+
+
+def test_extracted_file_resumes_at_analysis(manifest, scan):
+    sha = manifest.plan(scan, EXTRACT, ANALYZE).sha256
+    manifest.mark_extracted(scan, sha, EXTRACT, "texte brut")
+    plan = manifest.plan(scan, EXTRACT, ANALYZE)
+    assert (plan.action, plan.raw_text) == ("analyze", "texte brut")
+
+
+def test_done_file_is_skipped(manifest, scan, tmp_path):
+    _done(manifest, scan, tmp_path)
+    assert manifest.plan(scan, EXTRACT, ANALYZE).action == "skip"
+    assert manifest.stats() == {"done": 1}
+
+
+def test_changed_analyze_params_reuse_extracted_text(manifest, scan, tmp_path):
+    _done(manifest, scan, tmp_path)
+    plan = manifest.plan(scan, EXTRACT, {**ANALYZE, "prune": False})
+    assert (plan.action, plan.raw_text) == ("analyze", "texte brut")
+
+
+def test_changed_extract_params_extract_again(manifest, scan, tmp_path):
+    _done(manifest, scan, tmp_path)
+    assert manifest.plan(scan, {**EXTRACT, "dpi": 200}, ANALYZE).action == "extract"
+
+
+def test_missing_output_is_analyzed_again(manifest, scan, tmp_path):
+    _done(manifest, scan, tmp_path).unlink()
+    assert manifest.plan(scan, EXTRACT, ANALYZE).action == "analyze"
+
+
+def test_modified_file_is_extracted_again(manifest, scan, tmp_path):
+    _done(manifest, scan, tmp_path)
+    scan.write_bytes(b"%PDF-1.4 avoir")
+    st = scan.stat()
+    os.utime(scan, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    assert manifest.plan(scan, EXTRACT, ANALYZE).action == "extract"
+
+
+def test_failure_keeps_reached_stage(manifest, scan):
+    sha = manifest.plan(scan, EXTRACT, ANALYZE).sha256
+    manifest.mark_extracted(scan, sha, EXTRACT, "texte brut")
+    manifest.mark_failed(scan, sha, "analyze: timeout")
+    assert manifest.plan(scan, EXTRACT, ANALYZE).action == "analyze"
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Tests du pipeline par étapes (StageQueue / Stage) : python -m pytest -q"""
+
+import threading
+
+from ocr_pipeline import STOP, Stage, StageQueue
+
+
+def test_stage_handles_every_item_then_calls_on_done_once():
+    inbox, seen, done = StageQueue("test", maxsize=2), [], []
+    lock = threading.Lock()
+
+    def handler(item):
+        with lock: seen.append(item)
+
+    stage = Stage("test", handler, inbox, threads=4, on_done=lambda: done.append(True))
+    for i in range(50): inbox.put(i)
+    inbox.put(STOP)
+    stage.join()
+    assert sorted(seen) == list(range(50))
+    assert done == [True]
+
+
+def test_stop_propagates_through_chained_stages():
+    first, second, out = StageQueue("a", maxsize=1), StageQueue("b", maxsize=1), []
+    stages = [Stage("a", lambda x: second.put(x * 2), first, threads=3, on_done=lambda: second.put(STOP)),
+              Stage("b", out.append, second, threads=1)]
+    for i in range(10): first.put(i)
+    first.put(STOP)
+    for stage in stages: stage.join()
+    assert sorted(out) == [i * 2 for i in range(10)]
+
+
+def test_handler_error_does_not_stop_stage():
+    inbox, seen = StageQueue("test"), []
+
+    def handler(item):
+        if item == 1: raise ValueError("boom")
+        seen.append(item)
+
+    stage = Stage("test", handler, inbox)
+    for i in range(3): inbox.put(i)
+    inbox.put(STOP)
+    stage.join()
+    assert seen == [0, 2]
+
+
+def test_queue_stats_ignore_stop():
+    q = StageQueue("test", maxsize=4)
+    for i in range(3): q.put(i)
+    q.put(STOP)
+    stats = q.stats()
+    assert (stats["items"], stats["max_depth"], stats["capacity"]) == (3, 3, 4)